@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro API Token
+Shared secret the bot sends with every call to the portal's bot-facing API
+(/api/log, /api/schedules, ...), so nobody else can log or schedule commands
+"""
+
+import os
+
+from secret_file import load_or_create_secret
+
+HEADER = 'X-TeleCommand-Token'
+ENV_VAR = 'TELECOMMAND_API_TOKEN'
+
+
+def load(path='api.key'):
+    """The token: $TELECOMMAND_API_TOKEN, else a key file created by whichever of bot and portal starts first
+
+    Set the environment variable on both sides when the bot and the portal
+    run on different hosts.
+    """
+    env_token = os.environ.get(ENV_VAR)
+    if env_token:
+        return env_token
+    return load_or_create_secret(path, 32)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Audit Log
+Hash chain over command_logs: every row stores sha256(previous chain hash +
+row digest), and HMAC-signed checkpoints pin the chain every few rows, so
+edited, inserted or deleted rows show up on verification
+"""
+
+import os
+import hmac
+import json
+import hashlib
+from collections import deque
+from datetime import datetime, timezone
+
+from secret_file import load_or_create_secret
+
+GENESIS = '0' * 64  # Chain hash "before" the first row
+FIELDS = ('telegram_user_id', 'command', 'output', 'success', 'executed_at')
+# Execution metrics, hashed only when present so rows logged before they existed keep their digest
+METRIC_FIELDS = ('duration_seconds', 'exit_code', 'stdout_bytes', 'stderr_bytes', 'timed_out')
+COLUMNS = FIELDS + METRIC_FIELDS
+
+
+def row_digest(row):
+    """Digest of the audited fields of one log row (a mapping with FIELDS)"""
+    values = [row[f] for f in FIELDS]
+    metrics = [row[f] for f in METRIC_FIELDS]
+    if any(m is not None for m in metrics):
+        values += metrics
+    canonical = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def chain_hash(prev_hash, row):
+    return hashlib.sha256((prev_hash + row_digest(row)).encode('ascii')).hexdigest()
+
+
+def load_key(path):
+    """Checkpoint signing key: $TELECOMMAND_AUDIT_KEY, else a key file created on first use"""
+    env_key = os.environ.get('TELECOMMAND_AUDIT_KEY')
+    if env_key:
+        return env_key.encode()
+    return load_or_create_secret(path, 32).encode()
+
+
+def sign(key, last_log_id, chain):
+    return hmac.new(key, f'{last_log_id}:{chain}'.encode('ascii'), hashlib.sha256).hexdigest()
+
+
+def _number(value, kind):
+    try:
+        return kind(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize(entry, executed_at):
+    """Turn an /api/log entry into the row that gets stored (and hashed)"""
+    user_id = entry.get('user_id')
+    try:
+        user_id = int(user_id) if user_id is not None else None
+    except (TypeError, ValueError):
+        pass
+    output = entry.get('output')
+    duration = _number(entry.get('duration_seconds'), float)
+    timed_out = entry.get('timed_out')
+    return {
+        'telegram_user_id': user_id,
+        'command': str(entry.get('command')),
+        'output': str(output) if output is not None else None,
+        'success': 1 if entry.get('success') else 0,
+        'executed_at': executed_at,
+        'duration_seconds': round(duration, 3) if duration is not None else None,
+        'exit_code': _number(entry.get('exit_code'), int),
+        'stdout_bytes': _number(entry.get('stdout_bytes'), int),
+        'stderr_bytes': _number(entry.get('stderr_bytes'), int),
+        'timed_out': (1 if timed_out else 0) if timed_out is not None else None,
+    }
+
+
+def tail_hash(db):
+    row = db.execute('SELECT id, chain_hash FROM command_logs ORDER BY id DESC LIMIT 1').fetchone()
+    return (row[0], row[1] or GENESIS) if row else (0, GENESIS)
+
+
+def append(db, entries, key, checkpoint_interval):
+    """Insert entries at the end of the chain; call inside a write transaction
+
+    The caller must hold the write lock (BEGIN IMMEDIATE) so that no other
+    writer can move the tail between reading it and inserting.
+    """
+    # Same format as SQLite's CURRENT_TIMESTAMP, so old and new rows sort together
+    executed_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    rows = [normalize(e, executed_at) for e in entries]
+
+    _, prev = tail_hash(db)
+    params = []
+    for row in rows:
+        prev = chain_hash(prev, row)
+        params.append((*(row[f] for f in COLUMNS), prev))
+    db.executemany(f'''
+        INSERT INTO command_logs ({", ".join(COLUMNS)}, chain_hash)
+        VALUES ({", ".join("?" * (len(COLUMNS) + 1))})
+    ''', params)
+
+    last_id, prev = tail_hash(db)
+    checkpoint = db.execute('SELECT MAX(last_log_id) FROM log_checkpoints').fetchone()[0] or 0
+    if last_id - checkpoint >= checkpoint_interval:
+        db.execute('''
+            INSERT INTO log_checkpoints (last_log_id, chain_hash, signature) VALUES (?, ?, ?)
+        ''', (last_id, prev, sign(key, last_id, prev)))
+    return rows
+
+
+def backfill(db, chunk_size=1000):
+    """Chain rows written before hashing existed (or without it); returns rows updated"""
+    start = db.execute('SELECT MIN(id) FROM command_logs WHERE chain_hash IS NULL').fetchone()[0]
+    if start is None:
+        return 0
+    before = db.execute(
+        'SELECT chain_hash FROM command_logs WHERE id < ? ORDER BY id DESC LIMIT 1', (start,)
+    ).fetchone()
+    prev = (before[0] if before else None) or GENESIS
+
+    updated = 0
+    cursor = db.execute(f'SELECT id, {", ".join(COLUMNS)} FROM command_logs WHERE id >= ? ORDER BY id', (start,))
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            prev = chain_hash(prev, row)
+            params.append((prev, row['id']))
+        db.executemany('UPDATE command_logs SET chain_hash = ? WHERE id = ?', params)
+        updated += len(rows)
+    return updated
+
+
+def verify(db, key, start_id=None, end_id=None, progress_every=10000):
+    """Walk the chain from start_id to end_id with a streaming cursor
+
+    Yields {'checked', 'last_id'} progress dicts every progress_every rows and
+    finally a result dict with 'status' ('ok' or 'tampered'). Rows before
+    start_id are trusted as the starting point.
+    """
+    start_id = start_id or 1
+    if not end_id:
+        # Reach the newest checkpoint too, so rows deleted from the end are noticed
+        end_id = db.execute('''
+            SELECT MAX(m) FROM (SELECT MAX(id) AS m FROM command_logs
+                                UNION ALL SELECT MAX(last_log_id) FROM log_checkpoints)
+        ''').fetchone()[0] or 0
+
+    before = db.execute(
+        'SELECT chain_hash FROM command_logs WHERE id < ? ORDER BY id DESC LIMIT 1', (start_id,)
+    ).fetchone()
+    prev = (before[0] if before else None) or GENESIS
+
+    # One checkpoint per checkpoint_interval rows, so these are few enough to hold
+    checkpoints = {
+        row['last_log_id']: row for row in db.execute(
+            'SELECT * FROM log_checkpoints WHERE last_log_id BETWEEN ? AND ? ORDER BY last_log_id',
+            (start_id, end_id)
+        )
+    }
+    pending = deque(sorted(checkpoints))
+    result = {'start_id': start_id, 'end_id': end_id, 'checked': 0, 'checkpoints': 0}
+
+    def tampered(row_id, reason):
+        return dict(result, status='tampered', first_bad_id=row_id, reason=reason)
+
+    for checkpoint in checkpoints.values():
+        expected = sign(key, checkpoint['last_log_id'], checkpoint['chain_hash'])
+        if not hmac.compare_digest(expected, checkpoint['signature']):
+            yield tampered(checkpoint['last_log_id'], f"checkpoint #{checkpoint['id']} has an invalid signature")
+            return
+
+    cursor = db.execute(
+        f'SELECT id, chain_hash, {", ".join(COLUMNS)} FROM command_logs WHERE id BETWEEN ? AND ? ORDER BY id',
+        (start_id, end_id)
+    )
+    for row in cursor:
+        # A checkpointed row that never came up was deleted
+        if pending and pending[0] < row['id']:
+            yield tampered(pending[0], 'checkpointed row is missing')
+            return
+        prev = chain_hash(prev, row)
+        if row['chain_hash'] != prev:
+            yield tampered(row['id'], 'row does not match the hash chain (edited, inserted or preceded by a deleted row)')
+            return
+        if pending and pending[0] == row['id']:
+            if checkpoints[pending.popleft()]['chain_hash'] != prev:
+                yield tampered(row['id'], 'chain diverges from a signed checkpoint')
+                return
+            result['checkpoints'] += 1
+        result['checked'] += 1
+        if result['checked'] % progress_every == 0:
+            yield {'checked': result['checked'], 'last_id': row['id']}
+
+    if pending:
+        yield tampered(pending[0], 'checkpointed row is missing')
+        return
+    yield dict(result, status='ok')
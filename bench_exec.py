@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Exec Benchmark
+Compares command spawn latency through /bin/sh with the direct exec fast path
+"""
+
+import argparse
+import time
+
+import runner
+
+COMMANDS = ['true', 'uptime', 'echo "hello world"', 'ls -la /tmp']
+
+
+def measure(command, direct, runs):
+    """Run a command `runs` times and return its latencies in ms, sorted"""
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        runner.run_process(command, timeout=30, direct=direct)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark command spawn latency with and without a shell')
+    parser.add_argument('--runs', type=int, default=200, help='Runs per command and mode')
+    parser.add_argument('commands', nargs='*', default=COMMANDS)
+    args = parser.parse_args()
+
+    print(f'Runs: {args.runs} per command and mode')
+    for command in args.commands:
+        argv = runner.direct_argv(command)
+        if argv is None:
+            print(f'{command:<24} needs a shell, skipped')
+            continue
+        runner.run_process(command, timeout=30)  # Warm the PATH cache and page cache
+        shell = measure(command, False, args.runs)
+        direct = measure(command, True, args.runs)
+        p50s, p50d = shell[len(shell) // 2], direct[len(direct) // 2]
+        p95s, p95d = shell[int(len(shell) * 0.95) - 1], direct[int(len(direct) * 0.95) - 1]
+        print(f'{command:<24} shell p50 {p50s:>6.2f} ms  p95 {p95s:>6.2f} ms   '
+              f'direct p50 {p50d:>6.2f} ms  p95 {p95d:>6.2f} ms   ({p50s / p50d:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
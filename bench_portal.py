@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Portal Benchmark
+Measures requests/s on /api/log and / under concurrent clients, against a
+portal it starts on a scratch database (the benchmark's log rows can never
+be deleted from a real portal's hash-chained command log)
+"""
+
+import os
+import sys
+import signal
+import shutil
+import secrets
+import argparse
+import tempfile
+import threading
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import api_token
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_session(base_url, username=None, password=None):
+    """Create an HTTP session, logged in when credentials are given"""
+    s = requests.Session()
+    if username:
+        s.post(f'{base_url}/login', data={'username': username, 'password': password}, timeout=10)
+    return s
+
+
+def run_benchmark(name, base_url, method, path, total, clients, login=None, **kwargs):
+    """Fire `total` requests from `clients` threads and print throughput and latency"""
+    local = threading.local()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(_):
+        start = time.perf_counter()
+        try:
+            if not hasattr(local, 'session'):
+                local.session = make_session(base_url, *(login or ()))
+                start = time.perf_counter()
+            r = local.session.request(method, base_url + path, timeout=30, allow_redirects=False, **kwargs)
+            ok = r.status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(worker, range(total)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f'{name:<12} {total / duration:>9.1f} req/s   p50 {p50:>7.2f} ms   p95 {p95:>7.2f} ms   errors {errors[0]}')
+
+
+def start_portal(server, port, workers, workdir, token):
+    """Start a portal whose database and key files live in workdir; returns the Popen"""
+    if server == 'gunicorn':
+        argv = ['gunicorn', '--preload', '-w', str(workers), '-b', f'127.0.0.1:{port}', '--pythonpath', HERE, 'wsgi:app']
+    else:
+        argv = [sys.executable, os.path.join(HERE, 'web_portal.py'), '--host', '127.0.0.1', '--port', str(port)]
+        if server == 'production':
+            argv += ['--production', '--threads', str(workers)]
+    env = dict(os.environ, **{api_token.ENV_VAR: token})
+    # The portal keeps telecommand.db, config.json and its keys in the working directory
+    return subprocess.Popen(argv, cwd=workdir, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'Portal exited with status {process.returncode}')
+        try:
+            requests.get(f'{base_url}/login', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise SystemExit('Portal did not start in time')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the TeleCommand Pro portal on a scratch database')
+    parser.add_argument('--server', choices=('dev', 'production', 'gunicorn'), default='production',
+                        help='Flask dev server, waitress (--production) or gunicorn')
+    parser.add_argument('--workers', type=int, default=16, help='Threads (production) or worker processes (gunicorn)')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+    args = parser.parse_args()
+
+    url = f'http://127.0.0.1:{args.port}'
+    token = secrets.token_hex(32)
+    workdir = tempfile.mkdtemp(prefix='telecommand-bench-')
+    portal = start_portal(args.server, args.port, args.workers, workdir, token)
+    try:
+        wait_ready(url, portal)
+        print(f'Server: {args.server}  clients: {args.clients}  requests: {args.requests}')
+        run_benchmark('POST /api/log', url, 'POST', '/api/log', args.requests, args.clients,
+                      headers={api_token.HEADER: token},
+                      json={'user_id': 0, 'command': 'bench', 'output': 'x' * 200, 'success': 1})
+        # A fresh database has the default admin account
+        run_benchmark('GET /', url, 'GET', '/', args.requests, args.clients, login=('admin', 'admin123'))
+    finally:
+        if os.name == 'posix':
+            os.killpg(portal.pid, signal.SIGTERM)  # The dev server's reloader runs a child process
+        else:
+            portal.terminate()
+        portal.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
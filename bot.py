@@ -4,15 +4,34 @@ TeleCommand - Telegram Remote Command Bot
 A secure bot for managing host systems via Telegram with OS-level command execution
 """
 
+import time
+IMPORT_STARTED = time.perf_counter()  # Startup timing begins before the heavy imports
+
 import os
 import sys
 import platform
-import subprocess
 import logging
 import json
-import requests
-from datetime import datetime
+import queue
+import threading
+import signal
+import re
+import heapq
+import random
+import asyncio
+import hashlib
+import difflib
+import html
+import shutil
+import tempfile
+import subprocess
+from collections import OrderedDict
+from functools import cached_property, partial
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -21,6 +40,20 @@ from telegram.ext import (
     ContextTypes,
     filters,
 )
+from config_store import ConfigStore
+import api_token
+import runner
+import sandbox
+import shell_session
+import file_transfer
+import jobs
+import metrics
+import capture
+from send_queue import SendQueue
+
+# `requests` is only needed for portal calls and uploads, so it is imported on
+# first use (in a worker thread) rather than here, where it would delay startup
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
 
 # Configure logging
 logging.basicConfig(
@@ -34,23 +67,342 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class OutputCache:
+    """Bounded LRU of the last output per (user, command), used for diffs"""
+    
+    def __init__(self, maxsize=128, max_output_bytes=1024 * 1024):
+        self.maxsize = maxsize
+        self.max_output_bytes = max_output_bytes
+        self._data = OrderedDict()
+    
+    def get(self, user_id, command):
+        """Return (output, timestamp) of the previous run, or None"""
+        key = (user_id, command)
+        if key not in self._data:
+            return None
+        self._data.move_to_end(key)
+        return self._data[key]
+    
+    def put(self, user_id, command, output):
+        """Remember the latest output, skipping outputs too large to keep around"""
+        key = (user_id, command)
+        if len(output) > self.max_output_bytes:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (output, datetime.now())
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+def unified_range(start, stop):
+    """A hunk header range as difflib.unified_diff writes it: `3`, `3,4`, or `2,0` when empty"""
+    length = stop - start
+    if length == 1:
+        return f"{start + 1}"
+    return f"{start + 1 if length else start},{length}"
+
+
+def diff_outputs(old, new, context=2):
+    """Unified diff of two outputs, comparing hashed lines
+    
+    The common head and tail are stripped first, and only the changed middle is
+    matched, on integer line hashes rather than strings, so large, mostly
+    identical outputs diff quickly. The result is a valid unified diff (it
+    turns old into new), but because of the stripping its hunks can pair
+    lines differently from difflib.unified_diff's.
+    """
+    old_lines = old.splitlines()
+    new_lines = new.splitlines()
+    
+    # Strip the common prefix and suffix (keeping `context` lines for the hunks)
+    start = 0
+    limit = min(len(old_lines), len(new_lines))
+    while start < limit and old_lines[start] == new_lines[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old_lines[-1 - end] == new_lines[-1 - end]:
+        end += 1
+    if start == len(old_lines) == len(new_lines):
+        return ''
+    start = max(0, start - context)
+    end = max(0, end - context)
+    old_mid = old_lines[start:len(old_lines) - end]
+    new_mid = new_lines[start:len(new_lines) - end]
+    
+    matcher = difflib.SequenceMatcher(None, [hash(l) for l in old_mid], [hash(l) for l in new_mid], autojunk=False)
+    hunks = []
+    for group in matcher.get_grouped_opcodes(context):
+        i1, i2 = group[0][1], group[-1][2]
+        j1, j2 = group[0][3], group[-1][4]
+        lines = [f"@@ -{unified_range(start + i1, start + i2)} +{unified_range(start + j1, start + j2)} @@"]
+        for tag, a1, a2, b1, b2 in group:
+            if tag == 'equal':
+                lines.extend(' ' + l for l in old_mid[a1:a2])
+                continue
+            lines.extend('-' + l for l in old_mid[a1:a2])
+            lines.extend('+' + l for l in new_mid[b1:b2])
+        hunks.append('\n'.join(lines))
+    return '\n'.join(hunks)
+
+
+# /status rows per OS: (label, candidate commands). When there are several
+# candidates, the first whose program is installed is used.
+STATUS_COMMANDS = {
+    'Windows': (
+        ('Hostname', ['hostname']),
+        ('OS', ['ver']),
+        ('Uptime', ['systeminfo | findstr /C:"System Boot Time"']),
+        ('CPU', ['wmic cpu get name']),
+        ('Memory', ['systeminfo | findstr /C:"Total Physical Memory" /C:"Available Physical Memory"']),
+        ('Disk', ['wmic logicaldisk get name,freespace,size']),
+        ('Users', ['query user']),
+    ),
+    'Linux': (
+        ('Hostname', ['hostname']),
+        ('Uptime', ['uptime']),
+        ('CPU', ["top -bn1 | grep 'Cpu(s)' | head -1", "lscpu | grep 'Model name'"]),
+        ('Memory', ['free -h | grep Mem']),
+        ('Disk', ['df -h /']),
+        ('Users', ['who']),
+    ),
+    'Darwin': (
+        ('Hostname', ['hostname']),
+        ('Uptime', ['uptime']),
+        ('CPU', ["top -l 1 | grep 'CPU usage'"]),
+        ('Memory', ['vm_stat']),
+        ('Disk', ['df -h /']),
+        ('Users', ['who']),
+    ),
+}
+
+# /sys menu actions per OS: (callback data, button text, result title, candidate commands)
+SYS_ACTIONS = {
+    'Windows': (
+        ('sys_cpu', '💻 CPU Info', '💻 CPU Information', ['wmic cpu get name,numberofcores,maxclockspeed']),
+        ('sys_mem', '💾 Memory', '💾 Memory Usage', ['systeminfo | findstr /C:"Total Physical Memory" /C:"Available Physical Memory"']),
+        ('sys_disk', '💿 Disk Space', '💿 Disk Usage', ['wmic logicaldisk get name,freespace,size']),
+        ('sys_net', '🌐 Network', '🌐 Network Info', ['ipconfig /all']),
+        ('sys_proc', '📊 Processes', '📊 Top Processes', ['tasklist /FO TABLE /NH | findstr /V "^$" | more +1']),
+        ('sys_uptime', '⏰ Uptime', '⏰ System Uptime', ['systeminfo | findstr /C:"System Boot Time"']),
+    ),
+    'Linux': (
+        ('sys_cpu', '💻 CPU Info', '💻 CPU Information', ['lscpu | head -20']),
+        ('sys_mem', '💾 Memory', '💾 Memory Usage', ['free -h']),
+        ('sys_disk', '💿 Disk Space', '💿 Disk Usage', ['df -h']),
+        ('sys_net', '🌐 Network', '🌐 Network Info', ['ip addr show', 'ifconfig']),
+        ('sys_proc', '📊 Processes', '📊 Top Processes', ['ps aux --sort=-%mem | head -11']),
+        ('sys_uptime', '⏰ Uptime', '⏰ System Uptime', ['uptime']),
+    ),
+    'Darwin': (
+        ('sys_cpu', '💻 CPU Info', '💻 CPU Information', ['sysctl -n machdep.cpu.brand_string && sysctl -n hw.ncpu']),
+        ('sys_mem', '💾 Memory', '💾 Memory Usage', ['vm_stat']),
+        ('sys_disk', '💿 Disk Space', '💿 Disk Usage', ['df -h']),
+        ('sys_net', '🌐 Network', '🌐 Network Info', ['ifconfig']),
+        ('sys_proc', '📊 Processes', '📊 Top Processes', ['ps aux -m | head -11']),
+        ('sys_uptime', '⏰ Uptime', '⏰ System Uptime', ['uptime']),
+    ),
+}
+
+
+class CommandTables:
+    """Immutable /status and /sys tables for one OS, resolved lazily against installed programs
+    
+    Extra /sys buttons come from the sys_actions list in config.json, e.g.
+    {"id": "nginx", "button": "🌐 Nginx", "title": "Nginx Status",
+     "command": "systemctl status nginx", "os": ["Linux"]}
+    """
+    
+    _which = {}  # program -> installed?, shared so config reloads don't re-probe
+    
+    def __init__(self, os_type, plugins=()):
+        self.os_type = os_type if os_type in STATUS_COMMANDS else 'Darwin'
+        self.plugins = plugins
+    
+    def has_program(self, command):
+        """Whether the first program of a command is on PATH (probed once per name)"""
+        program = command.split()[0]
+        if program not in self._which:
+            self._which[program] = shutil.which(program) is not None
+        return self._which[program]
+    
+    def resolve(self, candidates):
+        """Pick the first candidate whose program exists, falling back to the last"""
+        if isinstance(candidates, str):
+            return candidates
+        for command in candidates[:-1]:
+            if self.has_program(command):
+                return command
+        return candidates[-1]
+    
+    @cached_property
+    def status(self):
+        """((label, command), ...) for /status"""
+        return tuple((label, self.resolve(candidates)) for label, candidates in STATUS_COMMANDS[self.os_type])
+    
+    @cached_property
+    def _sys_entries(self):
+        entries = OrderedDict(
+            (data, (button, title, self.resolve(candidates)))
+            for data, button, title, candidates in SYS_ACTIONS[self.os_type]
+        )
+        for plugin in self.plugins:
+            if plugin.get('os') and self.os_type not in plugin['os']:
+                continue
+            try:
+                data = f"sys_{plugin['id']}"
+                # Telegram limits callback data to 64 bytes, and the Changes button adds a diff: prefix
+                if len(f'diff:{data}'.encode()) > 64:
+                    raise ValueError(f"id is longer than {64 - len('diff:sys_')} bytes")
+                candidates = plugin['command']
+                if not candidates or not all(command.split() for command in
+                                             ([candidates] if isinstance(candidates, str) else candidates)):
+                    raise ValueError('empty command')
+                button = plugin.get('button', plugin['id'])
+                entries[data] = (button, plugin.get('title', button), self.resolve(candidates))
+            except (KeyError, AttributeError, TypeError, ValueError) as e:
+                logger.error(f"Ignoring invalid sys_actions entry {plugin!r}: {e}")
+        entries['sys_refresh'] = ('🔄 Refresh', '🔄 Menu Refreshed', 'echo Menu refreshed' if self.os_type == 'Windows' else 'echo "Menu refreshed"')
+        return entries
+    
+    @cached_property
+    def sys_actions(self):
+        """Read-only {callback data: (title, command)} for /sys buttons"""
+        return MappingProxyType({data: (title, command) for data, (_, title, command) in self._sys_entries.items()})
+    
+    @cached_property
+    def sys_keyboard(self):
+        """The /sys inline keyboard, two buttons per row with Refresh on its own row"""
+        buttons = [InlineKeyboardButton(button, callback_data=data)
+                   for data, (button, _, _) in self._sys_entries.items() if data != 'sys_refresh']
+        rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+        rows.append([InlineKeyboardButton(self._sys_entries['sys_refresh'][0], callback_data='sys_refresh')])
+        return InlineKeyboardMarkup(rows)
+
+
+def bot_entries(config):
+    """(name, settings) for every bot defined in config
+    
+    Without a `bots` list the top-level telegram_token is the only bot. Each
+    entry in `bots` needs its own telegram_token and may override any other
+    top-level setting (authorized_users, allowed_commands, ...).
+    """
+    bots = config.get('bots')
+    if not bots:
+        return [(None, config)]
+    return [(entry.get('name') or f'bot{index}', {**config, **entry}) for index, entry in enumerate(bots, 1)]
+
+
+class LogShipper:
+    """Sends command logs to the portal in batches from one background thread
+    
+    Shared by every bot in the process, so logging never blocks a handler.
+    """
+    
+    WARN_INTERVAL = 300  # Seconds between repeats of the same rejection warning
+    
+    def __init__(self, batch_size=100, portal_token=None):
+        self.batch_size = batch_size
+        self.portal_token = portal_token
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._warned = {}  # (url, status) -> when it was last logged
+    
+    def submit(self, portal_url, entry, endpoint='/api/log'):
+        """Queue an entry for an endpoint of the portal at portal_url"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((portal_url, endpoint, entry))
+        except queue.Full:
+            logger.warning("Log queue full, dropping command log entry")
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='log-shipper', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        import requests
+        session = requests.Session()
+        if self.portal_token:
+            session.headers[api_token.HEADER] = self.portal_token
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            by_target = {}
+            for portal_url, endpoint, entry in batch:
+                by_target.setdefault((portal_url, endpoint), []).append(entry)
+            for (portal_url, endpoint), entries in by_target.items():
+                try:
+                    response = session.post(portal_url + endpoint, json=entries, timeout=5)
+                except requests.RequestException:
+                    continue  # Silently fail if portal is not running
+                if response.status_code == 503:
+                    # Portal's write queue is full: give it a moment, then resend what it didn't take
+                    try:
+                        accepted = response.json().get('accepted', 0)
+                    except ValueError:
+                        accepted = 0
+                    time.sleep(1)
+                    for entry in entries[accepted:]:
+                        self.submit(portal_url, entry, endpoint)
+                elif response.status_code >= 400:
+                    self._warn_rejected(portal_url + endpoint, response.status_code, len(entries))
+    
+    def _warn_rejected(self, url, status, count):
+        """Log that the portal refused entries, at most once per WARN_INTERVAL per url and status"""
+        now = time.monotonic()
+        if now - self._warned.get((url, status), -self.WARN_INTERVAL) < self.WARN_INTERVAL:
+            return
+        self._warned[(url, status)] = now
+        if status in (401, 403):
+            reason = (f"the API token doesn't match the portal's; give both the same {api_token.ENV_VAR} "
+                      f"or share api.key")
+        else:
+            reason = "the portal rejected them"
+        logger.warning(f"Dropped {count} entries for {url} (HTTP {status}): {reason}")
+
+
 class HostManager:
     """Main bot class for host management"""
     
-    def __init__(self, config_path='config.json'):
-        """Initialize the bot with configuration"""
+    CONFIG_POLL_INTERVAL = 2  # Seconds between config.json change checks
+    
+    def __init__(self, config_path='config.json', name=None, log_shipper=None, job_queue=None, capture=None,
+                 portal_token=None):
+        """Initialize the bot with configuration
+        
+        name selects an entry of config['bots'] when several bots share the process.
+        capture is a capture.CaptureWriter that records updates and command results.
+        portal_token is sent with portal API calls (see api_token.py).
+        """
+        self.name = name
+        self.portal_token = portal_token
+        self.log_shipper = log_shipper or LogShipper()
+        self.job_queue = job_queue or jobs.JobQueue()
+        self.capture = capture
+        self.config_store = ConfigStore(config_path)
         self.config = self.load_config(config_path)
-        self.authorized_users = set(self.config.get('authorized_users', []))
-        self.allowed_commands = self.config.get('allowed_commands', [])
-        self.command_history = []
+        self.config_stamp = self.config_store.stamp()
+        self.config_checked_at = time.monotonic()
         self.os_type = platform.system()  # 'Windows', 'Linux', 'Darwin' (macOS)
+        self.apply_config()
+        self.command_history = []
+        self.output_cache = OutputCache(maxsize=self.config.get('diff_cache_size', 128))
+        if self.capture:
+            self.capture.config(self.name, self.config)
         logger.info(f"Detected OS: {self.os_type}")
         
     def load_config(self, config_path):
         """Load configuration from JSON file"""
         try:
-            with open(config_path, 'r') as f:
-                return json.load(f)
+            return self.bot_config(self.config_store.load())
         except FileNotFoundError:
             logger.error(f"Config file {config_path} not found!")
             raise
@@ -58,10 +410,50 @@ class HostManager:
             logger.error(f"Invalid JSON in config file {config_path}!")
             raise
     
+    def bot_config(self, config):
+        """This bot's view of config.json: top-level settings plus its `bots` entry"""
+        for name, settings in bot_entries(config):
+            if name == self.name:
+                return settings
+        return config
+    
+    def apply_config(self):
+        """Derive lookup structures from the loaded config"""
+        self.authorized_users = set(self.config.get('authorized_users', []))
+        self.admin_users = set(self.config.get('admin_users', []))
+        self.allowed_commands = self.config.get('allowed_commands', [])
+        self.portal_url = self.config.get('portal_url', 'http://localhost:5000').rstrip('/')
+        # Tables resolve lazily, so rebuilding on every reload costs nothing until used
+        self.command_tables = CommandTables(self.os_type, tuple(self.config.get('sys_actions', [])))
+    
+    def refresh_config(self):
+        """Reload config.json if the portal changed it (cheap stat check, throttled)"""
+        now = time.monotonic()
+        if now - self.config_checked_at < self.CONFIG_POLL_INTERVAL:
+            return
+        self.config_checked_at = now
+        
+        stamp = self.config_store.stamp()
+        if stamp is None or stamp == self.config_stamp:
+            return
+        try:
+            self.config = self.bot_config(self.config_store.load())
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Failed to reload config: {e}")
+            return
+        self.config_stamp = stamp
+        self.apply_config()
+        logger.info(f"Config reloaded (version {self.config.get('config_version', 0)})")
+    
     def is_authorized(self, user_id):
         """Check if user is authorized"""
+        self.refresh_config()
         return user_id in self.authorized_users
     
+    def is_admin(self, user_id):
+        """Whether a user may see and cancel everyone's jobs, not just their own"""
+        return user_id in self.admin_users
+    
     def log_command(self, user_id, username, command, result):
         """Log executed commands"""
         entry = {
@@ -75,22 +467,103 @@ class HostManager:
         logger.info(f"Command executed by {username} ({user_id}): {command}")
         
         # Send to web portal
+        self.log_shipper.submit(self.portal_url, {
+            'user_id': user_id,
+            'command': command,
+            'output': result.get('output', ''),
+            'success': 1 if result['success'] else 0,
+            **result.get('metrics', {})
+        })
+    
+    def record_user(self, user, denied=False):
+        """Tell the portal a Telegram user was seen, registering unknown users (denied: unauthorized attempt)"""
+        self.log_shipper.submit(self.portal_url, {
+            'user_id': user.id,
+            'username': user.username,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'denied': denied
+        }, endpoint='/api/activity')
+    
+    def portal_request(self, method, path, **kwargs):
+        """Call a portal API endpoint, returning the decoded JSON or None on failure"""
+        import requests
         try:
-            requests.post('http://localhost:5000/api/log', json={
-                'user_id': user_id,
-                'command': command,
-                'output': result.get('output', ''),
-                'success': 1 if result['success'] else 0
-            }, timeout=2)
-        except:
-            pass  # Silently fail if portal is not running
-    
-    def execute_command(self, command):
+            headers = {api_token.HEADER: self.portal_token} if self.portal_token else {}
+            response = requests.request(method, f'{self.portal_url}{path}', headers=headers, timeout=5, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            if isinstance(e, requests.HTTPError) and e.response.status_code in (401, 403):
+                e = f"{e} (API token doesn't match the portal's, see {api_token.ENV_VAR})"
+            logger.warning(f"Portal request {method} {path} failed: {e}")
+            return None
+    
+    def sandbox_limits(self, command_base):
+        """Pick the resource limits for a command from its class in config['sandbox']"""
+        classes = self.config.get('sandbox', {}).get('classes', {})
+        for name, limits in classes.items():
+            if name != 'default' and command_base in limits.get('commands', []):
+                return limits
+        return classes.get('default', {})
+    
+    def output_limits(self):
+        """Streaming output bounds from config (bytes kept from each end, kill ceiling)"""
+        return {
+            'head_bytes': self.config.get('output_head_bytes', 32768),
+            'tail_bytes': self.config.get('output_tail_bytes', 32768),
+            'max_bytes': self.config.get('max_output_bytes', 10 * 1024 * 1024),
+        }
+    
+    def run(self, command, command_base, timeout, on_start=None):
+        """Run a command, sandboxed if enabled, and build the handler result"""
+        settings = self.config.get('sandbox', {})
+        # Simple commands are exec'd without /bin/sh in between unless direct_exec is off
+        direct = self.config.get('direct_exec', True)
+        if settings.get('enabled') and sandbox.AVAILABLE:
+            result = sandbox.run_sandboxed(
+                command, timeout, self.sandbox_limits(command_base), settings.get('cgroup_root'),
+                on_start=on_start, direct=direct, **self.output_limits()
+            )
+        else:
+            result = runner.run_process(command, timeout, on_start=on_start, direct=direct, **self.output_limits())
+        
+        if result['timed_out']:
+            response = {
+                'success': False,
+                'output': '❌ Command timed out',
+                'error': 'Timeout'
+            }
+        else:
+            output = result['stdout'] if result['stdout'] else result['stderr']
+            response = {
+                'success': result['returncode'] == 0,
+                'output': output if output else '✅ Command executed successfully (no output)',
+                'error': result['stderr'] if result['returncode'] != 0 else None
+            }
+            if result['output_limited']:
+                response['success'] = False
+                response['output'] += f"\n\n❌ Killed: output exceeded {self.output_limits()['max_bytes']} bytes"
+                response['error'] = 'Output limit exceeded'
+        
+        if 'usage' in result:
+            response['usage'] = result['usage']
+        response['metrics'] = {
+            'duration_seconds': result['wall_seconds'],
+            'exit_code': result['returncode'],
+            'stdout_bytes': result['stdout_bytes'],
+            'stderr_bytes': result['stderr_bytes'],
+            'timed_out': result['timed_out'],
+        }
+        return response
+    
+    def execute_command(self, command, on_start=None):
         """Execute OS command with safety checks"""
         try:
+            command_base = command.split()[0] if command else ''
+            
             # Security check: verify command is allowed if whitelist is enabled
             if self.config.get('whitelist_enabled', True):
-                command_base = command.split()[0] if command else ''
                 if command_base not in self.allowed_commands and '*' not in self.allowed_commands:
                     return {
                         'success': False,
@@ -99,42 +572,270 @@ class HostManager:
                     }
             
             # Execute command
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=self.config.get('command_timeout', 30)
-            )
-            
-            output = result.stdout if result.stdout else result.stderr
-            
-            return {
-                'success': result.returncode == 0,
-                'output': output if output else '✅ Command executed successfully (no output)',
-                'error': result.stderr if result.returncode != 0 else None
-            }
+            return self.run(command, command_base, self.config.get('command_timeout', 30), on_start)
             
-        except subprocess.TimeoutExpired:
-            return {
-                'success': False,
-                'output': '❌ Command timed out',
-                'error': 'Timeout'
-            }
         except Exception as e:
             return {
                 'success': False,
                 'output': f'❌ Error executing command: {str(e)}',
                 'error': str(e)
             }
+    
+    def run_job(self, job):
+        """Job body: execute the command, handing its process to the job so /cancel can kill it"""
+        result = self.execute_command(job.command, on_start=job.attach)
+        if self.capture:
+            self.capture.result(self.name, job, result)
+        if job.cancelled:
+            metrics = result.get('metrics', {})
+            output = f"🛑 Cancelled (job #{job.id})"
+            if metrics.get('stdout_bytes') or metrics.get('stderr_bytes'):
+                output += f"\n\nOutput before it was killed:\n{result['output']}"
+            result.update(success=False, error='Cancelled', output=output)
+        return result
+    
+    def submit_command(self, command, user_id, priority=jobs.NORMAL):
+        """Queue a command on the job queue; returns the Job"""
+        return self.job_queue.submit(self.run_job, command, user_id, priority, owner=self.name)
+    
+    async def job_result(self, job):
+        """Wait for a job to finish and return its handler result"""
+        result = await asyncio.wrap_future(job.future)
+        if result is None:
+            return {
+                'success': False,
+                'output': f'🛑 Job #{job.id} was cancelled before it started',
+                'error': 'Cancelled'
+            }
+        return result
+    
+    async def run_command(self, command, user_id, priority=jobs.NORMAL):
+        """Run a command as a job and wait for its result"""
+        return await self.job_result(self.submit_command(command, user_id, priority))
+
+
+def truncate_output(output, limit):
+    """Shorten output to about limit characters, keeping its beginning and end"""
+    if len(output) <= limit:
+        return output
+    head = limit * 2 // 3
+    tail = limit - head
+    return output[:head] + "\n\n... (output truncated) ...\n\n" + output[-tail:]
+
+
+def format_usage(usage):
+    """One-line summary of sandbox resource usage"""
+    parts = [f"⏱ {usage['wall_seconds']}s", f"🧮 CPU {usage['cpu_seconds']}s", f"💾 {usage['max_rss_mb']} MB"]
+    if 'cgroup_memory_peak_mb' in usage:
+        parts.append(f"cgroup peak {usage['cgroup_memory_peak_mb']:.1f} MB")
+    return ' · '.join(parts)
+
 
+def parse_interval(text):
+    """Parse an interval like '90s', '5m', '2h' or '1d' into seconds"""
+    match = re.fullmatch(r'(\d+)([smhd]?)', text.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid interval '{text}'")
+    value, unit = int(match.group(1)), match.group(2) or 's'
+    return value * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[unit]
 
-# Initialize bot manager
-bot_manager = None
+
+def format_interval(seconds):
+    """Format seconds as a short interval string"""
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+class Scheduler:
+    """Runs recurring commands from a single heap-ordered timer in the bot's event loop
+    
+    Jobs are stored in the portal database (scheduled_jobs table) and synced
+    periodically, so jobs added from the portal are picked up without a restart.
+    """
+    
+    SYNC_INTERVAL = 30  # Seconds between job syncs with the portal
+    MAX_JITTER = 30  # Upper bound on random delay added to each run, in seconds
+    
+    def __init__(self, manager, owns=None):
+        self.manager = manager
+        # With several bots, each job runs on one of them only; owns(user_id) says which
+        self.owns = owns
+        self.application = None
+        self.jobs = {}  # job id -> job dict from the portal
+        self.heap = []  # (run_at, job id, generation)
+        self.generation = {}  # job id -> generation; bumping it voids stale heap entries
+        self.running = set()  # job ids currently executing
+        self.wakeup = asyncio.Event()
+        self.last_sync = 0
+    
+    async def start(self, application):
+        """Load persisted jobs and start the timer loop (called by run_applications once the bot is running)"""
+        self.application = application
+        await self.sync()
+        application.create_task(self.run())
+    
+    # Job bookkeeping
+    
+    def next_run(self, job, now):
+        """Work out when a job should next run (wall-clock timestamp)"""
+        last_run = job.get('last_run')
+        if job['kind'] == 'daily':
+            hour, minute = map(int, job['at_time'].split(':'))
+            current = datetime.fromtimestamp(now)
+            due = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if due.timestamp() > now:
+                previous = due - timedelta(days=1)
+            else:
+                previous, due = due, due + timedelta(days=1)
+            # Missed run: catch up once if the latest occurrence was skipped while down
+            if last_run is not None and last_run < previous.timestamp():
+                return now
+            return due.timestamp()
+        
+        interval = job['interval_seconds']
+        if last_run is None:
+            return now  # Run immediately to establish a baseline
+        # Missed runs are coalesced into a single immediate run
+        return max(last_run + interval, now)
+    
+    def jitter(self, job):
+        """Random delay so jobs sharing an interval do not fire together"""
+        period = job['interval_seconds'] if job['kind'] == 'every' else 86400
+        return random.uniform(0, min(period * 0.1, self.MAX_JITTER))
+    
+    def add(self, job, now=None):
+        """Add or replace a job and queue its next run"""
+        now = time.time() if now is None else now
+        job_id = job['id']
+        self.jobs[job_id] = job
+        self.generation[job_id] = self.generation.get(job_id, 0) + 1
+        run_at = self.next_run(job, now) + self.jitter(job)
+        heapq.heappush(self.heap, (run_at, job_id, self.generation[job_id]))
+        self.wakeup.set()
+    
+    def remove(self, job_id):
+        """Forget a job; its heap entries are dropped lazily"""
+        self.jobs.pop(job_id, None)
+        self.generation.pop(job_id, None)
+    
+    async def sync(self):
+        """Reconcile in-memory jobs with the portal database"""
+        self.last_sync = time.monotonic()
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(None, self.manager.portal_request, 'GET', '/api/schedules')
+        if rows is None:
+            return  # Portal unreachable: keep running what we have
+        
+        fetched = {row['id']: row for row in rows if self.owns is None or self.owns(row['telegram_user_id'])}
+        for job_id in list(self.jobs):
+            if job_id not in fetched:
+                self.remove(job_id)
+        
+        fields = ('command', 'kind', 'interval_seconds', 'at_time', 'match', 'notify')
+        for job_id, row in fetched.items():
+            current = self.jobs.get(job_id)
+            if current is None or any(current.get(f) != row.get(f) for f in fields):
+                if current is not None:
+                    row['last_run'] = current.get('last_run')
+                    row['last_hash'] = current.get('last_hash')
+                self.add(row)
+    
+    # Timer loop
+    
+    async def run(self):
+        """Sleep until the earliest job is due, then dispatch it"""
+        while True:
+            if time.monotonic() - self.last_sync >= self.SYNC_INTERVAL:
+                await self.sync()
+            
+            # Drop heap entries for removed or rescheduled jobs
+            while self.heap and self.generation.get(self.heap[0][1]) != self.heap[0][2]:
+                heapq.heappop(self.heap)
+            
+            now = time.time()
+            timeout = self.SYNC_INTERVAL
+            if self.heap:
+                timeout = min(timeout, max(0, self.heap[0][0] - now))
+            
+            if timeout > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            _, job_id, generation = heapq.heappop(self.heap)
+            job = self.jobs[job_id]
+            if job_id in self.running:
+                # Overlap protection: previous run still going, skip this tick
+                logger.warning(f"Scheduled job #{job_id} still running, skipping this run")
+            else:
+                self.running.add(job_id)
+                self.application.create_task(self.execute(job))
+            
+            # Queue the following run
+            period = job['interval_seconds'] if job['kind'] == 'every' else None
+            next_at = now + period if period else self.next_run(dict(job, last_run=now), now)
+            heapq.heappush(self.heap, (next_at + self.jitter(job), job_id, generation))
+    
+    async def execute(self, job):
+        """Run one scheduled job and notify its owner if warranted"""
+        job_id = job['id']
+        try:
+            owner = job['telegram_user_id']
+            if not self.manager.is_authorized(owner):
+                logger.warning(f"Skipping scheduled job #{job_id}: user {owner} is no longer authorized")
+                return
+            
+            loop = asyncio.get_running_loop()
+            result = await self.manager.run_command(job['command'], owner, jobs.BACKGROUND)
+            await loop.run_in_executor(
+                None, self.manager.log_command, owner, f"scheduler#{job_id}", job['command'], result
+            )
+            
+            output = result['output']
+            previous = self.manager.output_cache.get(owner, job['command'])
+            self.manager.output_cache.put(owner, job['command'], output)
+            digest = hashlib.sha256(output.encode('utf-8', 'replace')).hexdigest()
+            changed = digest != job.get('last_hash')
+            job['last_run'] = time.time()
+            job['last_hash'] = digest
+            await loop.run_in_executor(
+                None, lambda: self.manager.portal_request(
+                    'POST', f'/api/schedules/{job_id}/run',
+                    json={'last_run': job['last_run'], 'last_hash': digest}
+                )
+            )
+            
+            if job.get('match') and not re.search(job['match'], output):
+                return
+            if job.get('notify') != 'always' and not changed:
+                return
+            if changed and previous is not None:
+                # Send only what changed when we still have the previous output
+                output = diff_outputs(previous[0], output)
+            
+            if len(output) > 3500:
+                output = output[:3500] + "\n... (truncated)"
+            status_icon = "✅" if result['success'] else "❌"
+            await self.application.bot.send_message(
+                chat_id=owner,
+                text=f"⏰ {status_icon} *Scheduled job #{job_id}*\n`{job['command']}`\n\n```\n{output}\n```",
+                parse_mode='Markdown',
+                rate_limit_args={'merge': True}
+            )
+        except Exception as e:
+            logger.error(f"Scheduled job #{job_id} failed: {e}")
+        finally:
+            self.running.discard(job_id)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
+    manager = context.bot_data['manager']
     user = update.effective_user
     
     welcome_message = f"""
@@ -150,19 +851,29 @@ This bot allows you to manage your host system remotely.
 /help - Show detailed help
 /status - Show system status
 /exec <command> - Execute OS command
+/diff <command> - Show changes since last run
 /allowed - List allowed commands
 /history - Show command history (last 10)
 /sys - Quick system info menu
+/every <interval> <command> - Run a command repeatedly
+/schedule <HH:MM> <command> - Run a command daily
+/scheduled - List scheduled jobs
+/jobs - List running and queued commands
+/cancel <id> - Stop a running or queued command
+/shell - Open an interactive shell session
+/get <path> - Download a file or directory
+/put <path> - Upload (as a document caption)
 
 ⚠️ Security Notice:
 Only authorized users can execute commands.
 All actions are logged for security audit.
 """
     
-    if bot_manager.is_authorized(user.id):
+    if manager.is_authorized(user.id):
         welcome_message += "\n✅ You are authorized to use this bot."
     else:
         welcome_message += "\n❌ You are NOT authorized. Contact the administrator."
+    manager.record_user(user)
     
     await update.message.reply_text(welcome_message, parse_mode='Markdown')
 
@@ -181,12 +892,33 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • `/exec <command>` - Execute any allowed OS command
   Example: `/exec ls -la /tmp`
   
+• `/diff <command>` - Run a command and show only what changed since your last run of it
+
 • `/sys` - Interactive system info menu with quick actions
 
 • `/allowed` - View list of whitelisted commands
 
 • `/history` - View last 10 executed commands
 
+• `/jobs` - Running and queued commands, `/cancel <id>` - Stop one
+
+*Interactive Shell:*
+• `/shell` - Open a persistent shell; plain messages are run in it
+• `/ctrlc` - Interrupt, `/exit` - Close the session
+  (only available when the whitelist is disabled)
+
+*File Transfer:*
+• `/get <path>` - Receive a file, or a directory as .tar.gz
+• Send a document with caption `/put <path>` to save it on the host
+  (limited to the directories in `transfer_paths`)
+
+*Scheduled Commands:*
+• `/every <interval> <command>` - Run every 30s/5m/1h/1d
+• `/schedule <HH:MM> <command>` - Run daily at a time
+  Options: `--match=<regex>` only notify when output matches,
+  `--always` notify on every run (default: only on change)
+• `/scheduled` - List jobs, `/unschedule <id>` - Remove one
+
 *Security Features:*
 🔐 User authentication
 📝 Command logging
@@ -208,8 +940,9 @@ Be careful with destructive commands!
 
 async def check_auth(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Decorator-like function to check authorization"""
+    manager = context.bot_data['manager']
     user = update.effective_user
-    if not bot_manager.is_authorized(user.id):
+    if not manager.is_authorized(user.id):
         await update.message.reply_text(
             f"❌ Unauthorized access attempt!\n"
             f"User ID: {user.id}\n"
@@ -217,12 +950,14 @@ async def check_auth(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"This incident has been logged."
         )
         logger.warning(f"Unauthorized access attempt by {user.id} (@{user.username})")
+        manager.record_user(user, denied=True)
         return False
     return True
 
 
 async def execute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /exec command"""
+    manager = context.bot_data['manager']
     user = update.effective_user
     
     # Check authorization
@@ -239,73 +974,92 @@ async def execute_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     command = ' '.join(context.args)
     
-    # Show processing message
+    # Queue the command as a job, then show processing message
+    job = manager.submit_command(command, user.id)
     processing_msg = await update.message.reply_text(
-        f"⏳ Executing command...\n`{command}`",
+        f"⏳ Executing command... (job #{job.id}, /cancel {job.id} to stop)\n`{command}`",
         parse_mode='Markdown'
     )
     
-    # Execute command
-    result = bot_manager.execute_command(command)
+    result = await manager.job_result(job)
     
     # Log command
-    bot_manager.log_command(user.id, user.username or 'Unknown', command, result)
+    manager.log_command(user.id, user.username or 'Unknown', command, result)
+    manager.output_cache.put(user.id, command, result['output'])
     
     # Format output
-    output = result['output']
-    if len(output) > 4000:
-        output = output[:4000] + "\n\n... (output truncated)"
+    output = truncate_output(result['output'], 4000)
     
     status_icon = "✅" if result['success'] else "❌"
     response = f"{status_icon} *Command Result:*\n\n```\n{output}\n```"
+    if 'usage' in result:
+        response += f"\n{format_usage(result['usage'])}"
     
     # Update message with result
     await processing_msg.edit_text(response, parse_mode='Markdown')
 
 
+async def diff_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /diff command - run a command and show only what changed since last time"""
+    manager = context.bot_data['manager']
+    user = update.effective_user
+    
+    if not await check_auth(update, context):
+        return
+    
+    if not context.args:
+        await update.message.reply_text(
+            "❌ Usage: /diff <command>\n"
+            "Example: /diff docker ps"
+        )
+        return
+    
+    command = ' '.join(context.args)
+    previous = manager.output_cache.get(user.id, command)
+    job = manager.submit_command(command, user.id)
+    processing_msg = await update.message.reply_text(
+        f"⏳ Executing command... (job #{job.id}, /cancel {job.id} to stop)\n`{command}`",
+        parse_mode='Markdown'
+    )
+    
+    result = await manager.job_result(job)
+    manager.log_command(user.id, user.username or 'Unknown', command, result)
+    manager.output_cache.put(user.id, command, result['output'])
+    
+    status_icon = "✅" if result['success'] else "❌"
+    if previous is None:
+        header = f"{status_icon} *Command Result* (no previous run to compare):"
+        output = result['output']
+    else:
+        old_output, ran_at = previous
+        output = diff_outputs(old_output, result['output'])
+        if not output:
+            await processing_msg.edit_text(
+                f"{status_icon} *No changes* since {ran_at.strftime('%H:%M:%S')}",
+                parse_mode='Markdown'
+            )
+            return
+        header = f"{status_icon} *Changes since {ran_at.strftime('%H:%M:%S')}:*"
+    
+    if len(output) > 4000:
+        output = output[:4000] + "\n\n... (output truncated)"
+    await processing_msg.edit_text(f"{header}\n\n```\n{output}\n```", parse_mode='Markdown')
+
+
 async def system_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /status command"""
+    manager = context.bot_data['manager']
     user = update.effective_user
     
     if not await check_auth(update, context):
         return
     
     # Gather system information based on OS
-    os_type = bot_manager.os_type
-    
-    if os_type == 'Windows':
-        commands = {
-            'Hostname': 'hostname',
-            'OS': 'ver',
-            'Uptime': 'systeminfo | findstr /C:"System Boot Time"',
-            'CPU': 'wmic cpu get name',
-            'Memory': 'systeminfo | findstr /C:"Total Physical Memory" /C:"Available Physical Memory"',
-            'Disk': 'wmic logicaldisk get name,freespace,size',
-            'Users': 'query user',
-        }
-    elif os_type == 'Linux':
-        commands = {
-            'Hostname': 'hostname',
-            'Uptime': 'uptime',
-            'CPU': "top -bn1 | grep 'Cpu(s)' | head -1 || lscpu | grep 'Model name'",
-            'Memory': 'free -h | grep Mem',
-            'Disk': 'df -h /',
-            'Users': 'who',
-        }
-    else:  # macOS (Darwin)
-        commands = {
-            'Hostname': 'hostname',
-            'Uptime': 'uptime',
-            'CPU': "top -l 1 | grep 'CPU usage'",
-            'Memory': 'vm_stat',
-            'Disk': 'df -h /',
-            'Users': 'who',
-        }
-    
+    os_type = manager.os_type
     status_msg = f"🖥 *System Status ({os_type})*\n\n"
     
-    for label, cmd in commands.items():
-        result = bot_manager.execute_command(cmd)
+    for label, cmd in manager.command_tables.status:
+        result = await manager.run_command(cmd, user.id, jobs.INTERACTIVE)
         if result['success']:
             output = result['output'].strip()
             if len(output) > 200:
@@ -317,13 +1071,14 @@ async def system_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def allowed_commands(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /allowed command"""
+    manager = context.bot_data['manager']
     user = update.effective_user
     
     if not await check_auth(update, context):
         return
     
-    whitelist_enabled = bot_manager.config.get('whitelist_enabled', True)
-    allowed = bot_manager.allowed_commands
+    whitelist_enabled = manager.config.get('whitelist_enabled', True)
+    allowed = manager.allowed_commands
     
     if not whitelist_enabled or '*' in allowed:
         message = "✅ *Allowed Commands:* ALL\n\nWhitelist is disabled. All commands are allowed."
@@ -336,12 +1091,13 @@ async def allowed_commands(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def command_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /history command"""
+    manager = context.bot_data['manager']
     user = update.effective_user
     
     if not await check_auth(update, context):
         return
     
-    history = bot_manager.command_history[-10:]  # Last 10 commands
+    history = manager.command_history[-10:]  # Last 10 commands
     
     if not history:
         await update.message.reply_text("📝 No command history yet.")
@@ -359,105 +1115,457 @@ async def command_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def system_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /sys command - interactive system menu"""
+    manager = context.bot_data['manager']
     user = update.effective_user
     
     if not await check_auth(update, context):
         return
     
-    keyboard = [
-        [
-            InlineKeyboardButton("💻 CPU Info", callback_data='sys_cpu'),
-            InlineKeyboardButton("💾 Memory", callback_data='sys_mem'),
-        ],
-        [
-            InlineKeyboardButton("💿 Disk Space", callback_data='sys_disk'),
-            InlineKeyboardButton("🌐 Network", callback_data='sys_net'),
-        ],
-        [
-            InlineKeyboardButton("📊 Processes", callback_data='sys_proc'),
-            InlineKeyboardButton("⏰ Uptime", callback_data='sys_uptime'),
-        ],
-        [
-            InlineKeyboardButton("🔄 Refresh", callback_data='sys_refresh'),
-        ],
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(
         "🖥 *System Information Menu*\n\nSelect an option:",
-        reply_markup=reply_markup,
+        reply_markup=manager.command_tables.sys_keyboard,
         parse_mode='Markdown'
     )
 
 
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle button callbacks"""
+    manager = context.bot_data['manager']
     query = update.callback_query
     user = query.from_user
     
-    if not bot_manager.is_authorized(user.id):
+    if not manager.is_authorized(user.id):
         await query.answer("❌ Unauthorized!", show_alert=True)
+        logger.warning(f"Unauthorized button press by {user.id} (@{user.username})")
+        manager.record_user(user, denied=True)
         return
     
     await query.answer()
     
-    # Command mapping based on OS
-    os_type = bot_manager.os_type
-    
-    if os_type == 'Windows':
-        commands = {
-            'sys_cpu': ('💻 CPU Information', 'wmic cpu get name,numberofcores,maxclockspeed'),
-            'sys_mem': ('💾 Memory Usage', 'systeminfo | findstr /C:"Total Physical Memory" /C:"Available Physical Memory"'),
-            'sys_disk': ('💿 Disk Usage', 'wmic logicaldisk get name,freespace,size'),
-            'sys_net': ('🌐 Network Info', 'ipconfig /all'),
-            'sys_proc': ('📊 Top Processes', 'tasklist /FO TABLE /NH | findstr /V "^$" | more +1'),
-            'sys_uptime': ('⏰ System Uptime', 'systeminfo | findstr /C:"System Boot Time"'),
-            'sys_refresh': ('🔄 Menu Refreshed', 'echo Menu refreshed'),
-        }
-    elif os_type == 'Linux':
-        commands = {
-            'sys_cpu': ('💻 CPU Information', 'lscpu | head -20'),
-            'sys_mem': ('💾 Memory Usage', 'free -h'),
-            'sys_disk': ('💿 Disk Usage', 'df -h'),
-            'sys_net': ('🌐 Network Info', 'ip addr show || ifconfig'),
-            'sys_proc': ('📊 Top Processes', 'ps aux --sort=-%mem | head -11'),
-            'sys_uptime': ('⏰ System Uptime', 'uptime'),
-            'sys_refresh': ('🔄 Menu Refreshed', 'echo "Menu refreshed"'),
-        }
-    else:  # macOS (Darwin)
-        commands = {
-            'sys_cpu': ('💻 CPU Information', 'sysctl -n machdep.cpu.brand_string && sysctl -n hw.ncpu'),
-            'sys_mem': ('💾 Memory Usage', 'vm_stat'),
-            'sys_disk': ('💿 Disk Usage', 'df -h'),
-            'sys_net': ('🌐 Network Info', 'ifconfig'),
-            'sys_proc': ('📊 Top Processes', 'ps aux -m | head -11'),
-            'sys_uptime': ('⏰ System Uptime', 'uptime'),
-            'sys_refresh': ('🔄 Menu Refreshed', 'echo "Menu refreshed"'),
-        }
+    commands = manager.command_tables.sys_actions
     
-    if query.data in commands:
-        label, cmd = commands[query.data]
-        result = bot_manager.execute_command(cmd)
+    # "Changes" button: re-run and show a diff against the previous result
+    show_diff = query.data.startswith('diff:')
+    action = query.data[len('diff:'):] if show_diff else query.data
+    
+    if action in commands:
+        label, cmd = commands[action]
+        previous = manager.output_cache.get(user.id, cmd)
+        result = await manager.run_command(cmd, user.id, jobs.INTERACTIVE)
+        manager.output_cache.put(user.id, cmd, result['output'])
         
         output = result['output'].strip()
+        if show_diff and previous is not None:
+            output = diff_outputs(previous[0], result['output']) or '(no changes)'
+            label = f"{label} - changes since {previous[1].strftime('%H:%M:%S')}"
         if len(output) > 3500:
             output = output[:3500] + "\n... (truncated)"
         
         response = f"*{label}*\n\n```\n{output}\n```"
-        await query.edit_message_text(response, parse_mode='Markdown')
+        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔀 Changes", callback_data=f'diff:{action}')]])
+        await query.edit_message_text(response, reply_markup=reply_markup, parse_mode='Markdown')
+
+
+def parse_schedule_args(args):
+    """Split /every and /schedule arguments into (options, command)"""
+    options = {'match': None, 'notify': 'change'}
+    rest = list(args)
+    while rest and rest[0].startswith('--'):
+        flag = rest.pop(0)
+        if flag.startswith('--match='):
+            options['match'] = flag[len('--match='):]
+            re.compile(options['match'])  # Raises re.error if invalid
+        elif flag == '--always':
+            options['notify'] = 'always'
+        else:
+            raise ValueError(f"Unknown option '{flag}'")
+    if not rest:
+        raise ValueError("Missing command")
+    return options, ' '.join(rest)
+
+
+async def create_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE, job):
+    """Persist a new job in the portal and hand it to the scheduler"""
+    manager = context.bot_data['manager']
+    loop = asyncio.get_running_loop()
+    saved = await loop.run_in_executor(
+        None, lambda: manager.portal_request('POST', '/api/schedules', json=job)
+    )
+    if not saved:
+        await update.message.reply_text("❌ Could not save the schedule: web portal is not reachable.")
+        return
+    
+    context.bot_data['scheduler'].add(saved)
+    when = f"every {format_interval(saved['interval_seconds'])}" if saved['kind'] == 'every' else f"daily at {saved['at_time']}"
+    await update.message.reply_text(
+        f"⏰ Scheduled job #{saved['id']} ({when})\n`{saved['command']}`\n\n"
+        f"Notifying {'on every run' if saved['notify'] == 'always' else 'when the output changes'}"
+        f"{' and matches' if saved['match'] else ''}.",
+        parse_mode='Markdown'
+    )
+
+
+async def every_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /every command - run a command at a fixed interval"""
+    manager = context.bot_data['manager']
+    user = update.effective_user
+    
+    if not await check_auth(update, context):
+        return
+    
+    try:
+        if len(context.args) < 2:
+            raise ValueError("Missing arguments")
+        interval = parse_interval(context.args[0])
+        options, command = parse_schedule_args(context.args[1:])
+    except (ValueError, re.error) as e:
+        await update.message.reply_text(
+            f"❌ {e}\n"
+            "Usage: /every <interval> [--match=<regex>] [--always] <command>\n"
+            "Example: /every 5m --match=Exited docker ps -a"
+        )
+        return
+    
+    min_interval = manager.config.get('schedule_min_interval', 30)
+    if interval < min_interval:
+        await update.message.reply_text(f"❌ Interval must be at least {format_interval(min_interval)}.")
+        return
+    
+    await create_schedule(update, context, {
+        'telegram_user_id': user.id,
+        'command': command,
+        'kind': 'every',
+        'interval_seconds': interval,
+        **options,
+    })
+
+
+async def schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /schedule command - run a command daily at a fixed time"""
+    user = update.effective_user
+    
+    if not await check_auth(update, context):
+        return
+    
+    try:
+        if len(context.args) < 2:
+            raise ValueError("Missing arguments")
+        at_time = datetime.strptime(context.args[0], '%H:%M').strftime('%H:%M')
+        options, command = parse_schedule_args(context.args[1:])
+    except (ValueError, re.error) as e:
+        await update.message.reply_text(
+            f"❌ {e}\n"
+            "Usage: /schedule <HH:MM> [--match=<regex>] [--always] <command>\n"
+            "Example: /schedule 09:00 df -h"
+        )
+        return
+    
+    await create_schedule(update, context, {
+        'telegram_user_id': user.id,
+        'command': command,
+        'kind': 'daily',
+        'at_time': at_time,
+        **options,
+    })
+
+
+async def scheduled_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /scheduled command - list recurring jobs"""
+    scheduler = context.bot_data['scheduler']
+    if not await check_auth(update, context):
+        return
+    
+    if not scheduler.jobs:
+        await update.message.reply_text("⏰ No scheduled jobs.")
+        return
+    
+    message = "⏰ *Scheduled Jobs:*\n\n"
+    for job_id, job in sorted(scheduler.jobs.items()):
+        when = f"every {format_interval(job['interval_seconds'])}" if job['kind'] == 'every' else f"daily {job['at_time']}"
+        running = " 🔄" if job_id in scheduler.running else ""
+        message += f"#{job_id} ({when}){running}\n`{job['command']}`\n\n"
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+
+async def unschedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /unschedule command - remove a recurring job"""
+    manager = context.bot_data['manager']
+    scheduler = context.bot_data['scheduler']
+    if not await check_auth(update, context):
+        return
+    
+    if len(context.args) != 1 or not context.args[0].lstrip('#').isdigit():
+        await update.message.reply_text("❌ Usage: /unschedule <job id>")
+        return
+    
+    job_id = int(context.args[0].lstrip('#'))
+    loop = asyncio.get_running_loop()
+    removed = await loop.run_in_executor(
+        None, manager.portal_request, 'DELETE', f'/api/schedules/{job_id}'
+    )
+    if not removed:
+        await update.message.reply_text(f"❌ Could not remove job #{job_id}.")
+        return
+    
+    scheduler.remove(job_id)
+    await update.message.reply_text(f"🗑️ Scheduled job #{job_id} removed.")
+
+
+async def list_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /jobs command - list running and queued commands"""
+    manager = context.bot_data['manager']
+    user = update.effective_user
+    if not await check_auth(update, context):
+        return
+    
+    # Admins see every job of this bot, everyone else only their own
+    active = manager.job_queue.list(owner=manager.name, user_id=None if manager.is_admin(user.id) else user.id)
+    if not active:
+        await update.message.reply_text("⚙️ No running or queued commands.")
+        return
+    
+    message = "⚙️ *Jobs:*\n\n"
+    for job in active:
+        if job.state == 'running':
+            status = f"▶️ running {job.elapsed:.1f}s"
+        else:
+            status = f"⏳ queued {job.elapsed:.1f}s ({jobs.PRIORITY_NAMES[job.priority]})"
+        command = job.command if len(job.command) <= 60 else job.command[:60] + '...'
+        message += f"#{job.id} {status} · user {job.user_id}\n`{command}`\n\n"
+    message += "Stop one with /cancel <id>"
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+
+async def cancel_job(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /cancel command - drop a queued command or kill a running one"""
+    manager = context.bot_data['manager']
+    user = update.effective_user
+    if not await check_auth(update, context):
+        return
+    
+    if len(context.args) != 1 or not context.args[0].lstrip('#').isdigit():
+        await update.message.reply_text("❌ Usage: /cancel <job id> (see /jobs)")
+        return
+    
+    job_id = int(context.args[0].lstrip('#'))
+    state = manager.job_queue.cancel(job_id, owner=manager.name, user_id=None if manager.is_admin(user.id) else user.id)
+    manager.log_command(user.id, user.username or 'Unknown', f"/cancel {job_id}", {'success': state is not None})
+    if state is None:
+        await update.message.reply_text(f"❌ No running or queued job #{job_id}.")
+    elif state == 'queued':
+        await update.message.reply_text(f"🛑 Job #{job_id} removed from the queue.")
+    else:
+        await update.message.reply_text(f"🛑 Job #{job_id} killed.")
+
+
+async def get_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /get command - send a file, or a directory as .tar.gz, as documents"""
+    manager = context.bot_data['manager']
+    user = update.effective_user
+    
+    if not await check_auth(update, context):
+        return
+    
+    if not context.args:
+        await update.message.reply_text(
+            "❌ Usage: /get <path>\n"
+            "Example: /get /var/log/syslog"
+        )
+        return
+    
+    path = ' '.join(context.args)
+    part_size = manager.config.get('transfer_part_mb', 45) * 1024 * 1024
+    workdir = tempfile.mkdtemp(prefix='telecommand-get-')
+    loop = asyncio.get_running_loop()
+    try:
+        real = file_transfer.resolve_allowed(path, manager.config.get('transfer_paths', []))
+        status_msg = await update.message.reply_text(f"📦 Preparing `{path}`...", parse_mode='Markdown')
+        
+        started = time.monotonic()
+        parts, source_bytes, packed_bytes = await loop.run_in_executor(
+            None, file_transfer.pack, real, workdir, part_size
+        )
+        for index, part in enumerate(parts, 1):
+            await status_msg.edit_text(f"📤 Uploading part {index}/{len(parts)}...")
+            with open(part, 'rb') as f:
+                await context.bot.send_document(
+                    chat_id=update.effective_chat.id,
+                    document=f,
+                    filename=os.path.basename(part),
+                    read_timeout=300,
+                    write_timeout=300
+                )
+        elapsed = time.monotonic() - started
+        
+        summary = f"✅ Sent {len(parts)} file(s): {file_transfer.format_throughput(packed_bytes, elapsed)}"
+        if packed_bytes != source_bytes:
+            summary += f"\nCompressed from {source_bytes / (1024 * 1024):.1f} MB"
+        if len(parts) > 1:
+            summary += "\nJoin the parts with: cat *.part* > file"
+        await status_msg.edit_text(summary)
+        manager.log_command(user.id, user.username or 'Unknown', f"/get {path}", {'success': True, 'output': summary})
+    except (file_transfer.TransferError, OSError, TelegramError) as e:
+        await update.message.reply_text(f"❌ {e}")
+        manager.log_command(user.id, user.username or 'Unknown', f"/get {path}", {'success': False, 'output': str(e)})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def put_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle documents captioned /put <path> - save the upload to disk"""
+    manager = context.bot_data['manager']
+    user = update.effective_user
+    
+    if not await check_auth(update, context):
+        return
+    
+    caption = (update.message.caption or '').strip()
+    if not caption.startswith('/put'):
+        await update.message.reply_text("📎 To save a file on the host, send it with the caption: /put <path>")
+        return
+    
+    import requests
+    document = update.message.document
+    target = caption[len('/put'):].strip() or '.'
+    try:
+        # A directory (or trailing slash) target keeps the uploaded file name
+        if target.endswith(os.sep) or os.path.isdir(os.path.expanduser(target)):
+            target = os.path.join(target, document.file_name or f'upload-{document.file_unique_id}')
+        destination = file_transfer.resolve_allowed(target, manager.config.get('transfer_paths', []))
+        if not os.path.isdir(os.path.dirname(destination)):
+            raise file_transfer.TransferError(f"Directory {os.path.dirname(destination)} does not exist.")
+        
+        status_msg = await update.message.reply_text(f"📥 Receiving `{document.file_name}`...", parse_mode='Markdown')
+        started = time.monotonic()
+        telegram_file = await document.get_file()
+        written = await asyncio.get_running_loop().run_in_executor(
+            None, file_transfer.download, telegram_file.file_path, destination,
+            manager.config.get('transfer_max_upload_mb', 20) * 1024 * 1024
+        )
+        elapsed = time.monotonic() - started
+        
+        summary = f"✅ Saved to {destination}: {file_transfer.format_throughput(written, elapsed)}"
+        await status_msg.edit_text(summary)
+        manager.log_command(user.id, user.username or 'Unknown', f"/put {destination}", {'success': True, 'output': summary})
+    except (file_transfer.TransferError, OSError, TelegramError, requests.RequestException) as e:
+        await update.message.reply_text(f"❌ {e}")
+        manager.log_command(user.id, user.username or 'Unknown', f"/put {target}", {'success': False, 'output': str(e)})
+
+
+def shell_allowed(manager):
+    """Interactive shells bypass the per-command whitelist, so only allow them without one"""
+    allowed = manager.allowed_commands
+    return not manager.config.get('whitelist_enabled', True) or '*' in allowed
+
+
+async def send_shell_output(bot, chat_id, text):
+    """Send shell output as preformatted messages, split to fit Telegram's limit"""
+    text = text.strip('\n')
+    if not text:
+        return
+    for i in range(0, len(text), 3800):
+        await bot.send_message(
+            chat_id=chat_id,
+            text=f"<pre>{html.escape(text[i:i + 3800])}</pre>",
+            parse_mode='HTML',
+            rate_limit_args={'merge': True}
+        )
+
+
+async def send_shell_closed(bot, chat_id, reason):
+    """Tell the user their shell session ended"""
+    await bot.send_message(chat_id=chat_id, text=f"🔒 Shell session closed ({reason}).")
+
+
+async def shell_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /shell command - open a persistent interactive shell"""
+    manager = context.bot_data['manager']
+    shells = context.bot_data['shells']
+    user = update.effective_user
+    
+    if not await check_auth(update, context):
+        return
+    
+    if not shell_session.AVAILABLE:
+        await update.message.reply_text("❌ Interactive shells are not supported on this platform.")
+        return
+    if not shell_allowed(manager):
+        await update.message.reply_text("❌ Interactive shells are disabled while the command whitelist is enabled.")
+        return
+    
+    if shells.get(user.id) is not None:
+        await update.message.reply_text("🐚 You already have an open shell session. Use /exit to close it.")
+        return
+    try:
+        shells.open(user.id, update.effective_chat.id)
+    except (RuntimeError, OSError) as e:
+        await update.message.reply_text(f"❌ Could not start shell: {e}")
+        return
+    
+    logger.info(f"Shell session opened by {user.username} ({user.id})")
+    await update.message.reply_text(
+        "🐚 *Shell session started*\n\n"
+        "Plain messages are now sent to the shell, and `cd`, variables and virtualenvs carry over.\n"
+        "/ctrlc - Interrupt the running command\n"
+        "/exit - Close the session\n\n"
+        f"Idle sessions close after {format_interval(shells.idle_timeout)}.",
+        parse_mode='Markdown'
+    )
+
+
+async def exit_shell(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /exit command - close the shell session"""
+    shells = context.bot_data['shells']
+    if not await check_auth(update, context):
+        return
+    
+    if shells.close(update.effective_user.id):
+        await update.message.reply_text("🔒 Shell session closed.")
+    else:
+        await update.message.reply_text("No open shell session.")
+
+
+async def interrupt_shell(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /ctrlc command - interrupt the shell's foreground command"""
+    shells = context.bot_data['shells']
+    if not await check_auth(update, context):
+        return
+    
+    session = shells.get(update.effective_user.id)
+    if session is None:
+        await update.message.reply_text("No open shell session.")
+        return
+    session.interrupt()
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle regular text messages"""
+    manager = context.bot_data['manager']
+    shells = context.bot_data['shells']
     user = update.effective_user
     
-    if not bot_manager.is_authorized(user.id):
+    if not manager.is_authorized(user.id):
         await update.message.reply_text(
             "❌ You are not authorized to use this bot.\n"
             f"Your User ID: `{user.id}`\n\n"
             "Please contact the administrator to get access.",
             parse_mode='Markdown'
         )
+        manager.record_user(user, denied=True)
+        return
+    
+    # Forward to the user's shell session if one is open
+    session = shells.get(user.id)
+    if session is not None:
+        if not shell_allowed(manager):
+            shells.close(user.id)
+            await update.message.reply_text("🔒 Shell session closed: the command whitelist was enabled.")
+            return
+        command = update.message.text
+        session.send(command)
+        manager.log_command(user.id, user.username or 'Unknown', f"shell$ {command}", {'success': True})
         return
     
     await update.message.reply_text(
@@ -465,50 +1573,236 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+def build_application(manager, owns=None, request=None):
+    """Create one bot's Application, with its own scheduler and shell sessions
+    
+    request replaces the HTTP client for Bot API calls (replay.py stubs it).
+    """
+    config = manager.config
+    scheduler = Scheduler(manager, owns)
+    # All outgoing API calls are paced centrally to stay under Telegram's flood limits
+    send_queue = SendQueue(
+        global_rate=config.get('send_rate_global', 30),
+        chat_rate=config.get('send_rate_chat', 1),
+        group_per_minute=config.get('send_rate_group_per_minute', 20)
+    )
+    builder = Application.builder().token(config['telegram_token']).rate_limiter(send_queue)
+    if manager.capture:
+        # Record each update as it arrives, before it waits for a handler
+        builder = builder.update_queue(capture.CaptureQueue(manager.capture, manager.name))
+    if request is not None:
+        builder = builder.request(request)
+    application = builder.build()
+    shells = shell_session.ShellManager(
+        partial(send_shell_output, application.bot),
+        partial(send_shell_closed, application.bot),
+        shell=config.get('shell', '/bin/sh'),
+        max_sessions=config.get('shell_max_sessions', 3),
+        idle_timeout=config.get('shell_idle_timeout', 600)
+    )
+    application.bot_data.update(manager=manager, scheduler=scheduler, shells=shells)
+    
+    # Register handlers
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("exec", execute_command))
+    application.add_handler(CommandHandler("diff", diff_command))
+    application.add_handler(CommandHandler("status", system_status))
+    application.add_handler(CommandHandler("allowed", allowed_commands))
+    application.add_handler(CommandHandler("history", command_history))
+    application.add_handler(CommandHandler("sys", system_menu))
+    application.add_handler(CommandHandler("every", every_command))
+    application.add_handler(CommandHandler("schedule", schedule_command))
+    application.add_handler(CommandHandler("scheduled", scheduled_jobs))
+    application.add_handler(CommandHandler("unschedule", unschedule_command))
+    application.add_handler(CommandHandler("jobs", list_jobs))
+    application.add_handler(CommandHandler("cancel", cancel_job))
+    application.add_handler(CommandHandler("shell", shell_command))
+    application.add_handler(CommandHandler("exit", exit_shell))
+    application.add_handler(CommandHandler("ctrlc", interrupt_shell))
+    application.add_handler(CommandHandler("get", get_file))
+    application.add_handler(MessageHandler(filters.Document.ALL, put_file))
+    application.add_handler(CallbackQueryHandler(button_callback))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    return application
+
+
+async def run_applications(applications, executor, on_ready=None):
+    """Poll every bot from this event loop until SIGINT/SIGTERM
+    
+    on_ready is called once every bot has connected and started polling.
+    """
+    loop = asyncio.get_running_loop()
+    # One worker pool runs blocking work (commands, portal calls) for all bots
+    loop.set_default_executor(executor)
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+    
+    initialized = []
+    try:
+        # Connect (getMe) all bots concurrently so startup costs one round trip
+        results = await asyncio.gather(*(app.initialize() for app in applications), return_exceptions=True)
+        initialized = [app for app, result in zip(applications, results) if not isinstance(result, BaseException)]
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        for application in applications:
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            await application.start()
+            await application.bot_data['scheduler'].start(application)
+            logger.info(f"🚀 Bot @{application.bot.username} started successfully!")
+        if on_ready:
+            on_ready([app.bot.username for app in applications])
+        await stop.wait()
+    finally:
+        for application in reversed(initialized):
+            if application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+
+
+def write_ready_file(path, timings):
+    """Tell the portal the bot is up: written atomically once polling has started"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'pid': os.getpid(), 'ready_at': time.time(), **timings}, f)
+    os.replace(tmp_path, path)
+
+
+def profile_imports(top=15):
+    """Print the slowest imports of bot.py, like `python -X importtime` but summarized"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import bot'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # Nesting shown as two spaces per level
+        rows.append((int(cumulative_us), int(self_us), depth, name.strip()))
+    total = sum(cumulative for cumulative, _, depth, _ in rows if depth == 0)
+    print(f"Total import time: {total / 1000:.1f} ms\n")
+    print("Imported by bot.py (cumulative):")
+    for cumulative, _, _, name in sorted(r for r in rows if r[2] == 1)[::-1][:top]:
+        print(f"  {cumulative / 1000:>7.1f} ms  {name}")
+    print("\nSlowest modules (self):")
+    for self_us, name in sorted(((r[1], r[3]) for r in rows), reverse=True)[:top]:
+        print(f"  {self_us / 1000:>7.1f} ms  {name}")
+
+
+def open_capture(config):
+    """CaptureWriter when capture is on (config['capture']['path'] or --capture PATH), else None"""
+    settings = dict(config.get('capture') or {})
+    if '--capture' in sys.argv[:-1]:
+        settings['path'] = sys.argv[sys.argv.index('--capture') + 1]
+    if not settings.get('path'):
+        return None
+    logger.info(f"Capturing updates and command results to {settings['path']}")
+    return capture.CaptureWriter(
+        settings['path'],
+        max_output_chars=settings.get('max_output_chars', 2000),
+        redact_patterns=settings.get('redact_patterns', ())
+    )
+
+
 def main():
-    """Start the bot"""
-    global bot_manager
+    """Start the bot(s)"""
+    if '--profile-imports' in sys.argv:
+        profile_imports()
+        return
+    
+    main_started = time.perf_counter()
     
-    # Write PID file for process management by web portal
+    # Write PID file for process management by web portal; the ready file follows
+    # once the bots are connected, and is removed again on exit
     pid_file = 'bot.pid'
+    ready_file = 'bot.ready'
     with open(pid_file, 'w') as f:
         f.write(str(os.getpid()))
     
     try:
-        # Initialize bot manager
+        # One HostManager per bot token, all sharing a log shipper and the job workers
+        capture_writer = None
         try:
-            bot_manager = HostManager('config.json')
+            config = ConfigStore('config.json').load()
+            portal_token = api_token.load()
+            log_shipper = LogShipper(portal_token=portal_token)
+            job_queue = jobs.JobQueue(workers=config.get('job_workers', 4))
+            capture_writer = open_capture(config)
+            managers = [
+                HostManager(
+                    'config.json', name=name, log_shipper=log_shipper, job_queue=job_queue, capture=capture_writer,
+                    portal_token=portal_token
+                )
+                for name, _ in bot_entries(config)
+            ]
         except Exception as e:
             logger.error(f"Failed to initialize bot: {e}")
             return
         
-        # Get token from config
-        token = bot_manager.config.get('telegram_token')
-        if not token:
+        if not all(manager.config.get('telegram_token') for manager in managers):
             logger.error("No telegram_token found in config.json!")
             return
         
-        # Create application
-        application = Application.builder().token(token).build()
+        def owner_of(user_id):
+            """First bot that authorizes the user; its scheduler runs the user's jobs"""
+            return next((m for m in managers if m.is_authorized(user_id)), None)
         
-        # Register handlers
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("exec", execute_command))
-        application.add_handler(CommandHandler("status", system_status))
-        application.add_handler(CommandHandler("allowed", allowed_commands))
-        application.add_handler(CommandHandler("history", command_history))
-        application.add_handler(CommandHandler("sys", system_menu))
-        application.add_handler(CallbackQueryHandler(button_callback))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+        applications = [
+            build_application(manager, owns=lambda user_id, m=manager: owner_of(user_id) is m)
+            if len(managers) > 1 else build_application(manager)
+            for manager in managers
+        ]
+        # Host metrics are the same for every bot; report them once, to the first bot's portal
+        if config.get('metrics_interval', 15):
+            metrics.MetricsReporter(managers[0].portal_url, config.get('metrics_interval', 15), portal_token).start()
         
-        # Start bot
-        logger.info("🚀 Bot started successfully!")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        executor = ThreadPoolExecutor(
+            max_workers=config.get('executor_workers', 8), thread_name_prefix='telecommand'
+        )
+        setup_done = time.perf_counter()
+        
+        def on_ready(usernames):
+            now = time.perf_counter()
+            timings = {
+                'bots': usernames,
+                'import_seconds': round(IMPORT_SECONDS, 3),
+                'setup_seconds': round(setup_done - main_started, 3),
+                'connect_seconds': round(now - setup_done, 3),
+                'startup_seconds': round(now - IMPORT_STARTED, 3),
+            }
+            write_ready_file(ready_file, timings)
+            logger.info(
+                f"Ready in {timings['startup_seconds']}s (imports {timings['import_seconds']}s, "
+                f"setup {timings['setup_seconds']}s, connect {timings['connect_seconds']}s)"
+            )
+        
+        try:
+            asyncio.run(run_applications(applications, executor, on_ready))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            job_queue.shutdown()
+            if sys.version_info >= (3, 9):
+                executor.shutdown(wait=False, cancel_futures=True)
+            else:
+                executor.shutdown(wait=False)  # cancel_futures is new in 3.9
+            if capture_writer:
+                capture_writer.close()
     finally:
-        # Clean up PID file on exit
-        if os.path.exists(pid_file):
-            os.remove(pid_file)
+        # Clean up PID and ready files on exit
+        for path in (pid_file, ready_file):
+            if os.path.exists(path):
+                os.remove(path)
 
 
 if __name__ == '__main__':
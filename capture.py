@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Traffic Capture
+Records the bot's incoming updates and command results, redacted, to a
+compact JSONL file that replay.py can feed back through the handlers
+"""
+
+import re
+import gzip
+import json
+import time
+import queue
+import asyncio
+import hashlib
+import logging
+import threading
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Secrets that may show up in commands, outputs or messages; matches become <redacted>
+REDACT_PATTERNS = (
+    r'\b\d{6,12}:[A-Za-z0-9_-]{30,}',  # Telegram bot tokens
+    r'(?i)\b(?:password|passwd|pwd|secret|token|api[_-]?key)\s*[=:]\s*\S+',
+    r'(?i)\bbearer\s+[A-Za-z0-9._~+/=-]+',
+    r'\bAKIA[0-9A-Z]{16}\b',  # AWS access key ids
+    r'-----BEGIN [A-Z ]*PRIVATE KEY-----.*?-----END [A-Z ]*PRIVATE KEY-----',
+)
+# Names and contact details in updates are replaced by a stable pseudonym
+PERSONAL_FIELDS = {'first_name', 'last_name', 'username', 'title', 'phone_number', 'email', 'bio'}
+# Message flags PTB always serializes; dropped when false to keep records small
+DEFAULT_FLAGS = {'group_chat_created', 'supergroup_chat_created', 'channel_chat_created', 'delete_chat_photo'}
+# Config keys never written to a capture
+SECRET_CONFIG_KEYS = re.compile(r'(?i)token|password|secret|api_key')
+
+
+def pseudonym(value):
+    return 'anon-' + hashlib.sha256(str(value).encode('utf-8')).hexdigest()[:8]
+
+
+def read_records(path):
+    """Yield the records of a capture file in order"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class CaptureWriter:
+    """Appends captured records to a JSONL file, gzipped if the path ends in .gz
+
+    Records are redacted and serialized on a background thread, so capturing
+    adds next to nothing to handler latency.
+    """
+
+    def __init__(self, path, max_output_chars=2000, redact_patterns=()):
+        self.path = path
+        self.max_output_chars = max_output_chars
+        self.patterns = [re.compile(p, re.S) for p in (*REDACT_PATTERNS, *redact_patterns)]
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._run, name='capture-writer', daemon=True)
+        self._thread.start()
+
+    def _put(self, kind, bot, payload):
+        try:
+            self._queue.put_nowait((kind, bot, time.time(), payload))
+        except queue.Full:
+            logger.warning("Capture queue full, dropping a record")
+
+    def config(self, bot, config):
+        """Record a bot's settings so the replay runs with the same ones"""
+        self._put('config', bot, dict(config))
+
+    def update(self, bot, update):
+        self._put('update', bot, update)
+
+    def result(self, bot, job, result):
+        """Record what a job's command returned (before any cancellation rewrite)"""
+        self._put('result', bot, (job, dict(result)))
+
+    def redact(self, value):
+        if isinstance(value, str):
+            for pattern in self.patterns:
+                value = pattern.sub('<redacted>', value)
+            return value
+        if isinstance(value, dict):
+            return {
+                key: pseudonym(item) if key in PERSONAL_FIELDS and item else self.redact(item)
+                for key, item in value.items()
+                if not (key in DEFAULT_FLAGS and item is False)
+            }
+        if isinstance(value, list):
+            return [self.redact(item) for item in value]
+        return value
+
+    def build(self, kind, bot, t, payload):
+        """The JSON record for a queued item"""
+        record = {'t': round(t, 3), 'type': kind, 'bot': bot}
+        if kind == 'config':
+            record['config'] = {
+                key: value for key, value in payload.items()
+                if key != 'bots' and not SECRET_CONFIG_KEYS.search(key)
+            }
+        elif kind == 'update':
+            record['update'] = self.redact(payload.to_dict())
+        else:
+            job, result = payload
+            output = result.get('output') or ''
+            record.update(
+                command=self.redact(job.command),
+                user_id=job.user_id,
+                priority=job.priority,
+                queued=round((job.started or job.submitted) - job.submitted, 4),
+                success=result['success'],
+                error=self.redact(result.get('error')),
+                output=self.redact(output[:self.max_output_chars]),
+                output_chars=len(output),
+                metrics=result.get('metrics'),
+                usage=result.get('usage'),
+            )
+        return {key: value for key, value in record.items() if value is not None}
+
+    def _run(self):
+        opener = gzip.open if self.path.endswith('.gz') else open
+        with opener(self.path, 'at', encoding='utf-8') as f:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                try:
+                    line = json.dumps(self.build(*item), separators=(',', ':'), ensure_ascii=False, default=str)
+                except Exception as e:
+                    logger.warning(f"Failed to capture a {item[0]} record: {e}")
+                    continue
+                f.write(line + '\n')
+                if self._queue.empty():
+                    f.flush()  # Keep the file readable while the bot runs
+
+    def close(self):
+        """Write out everything queued and close the file"""
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+
+class CaptureQueue(asyncio.Queue):
+    """Application update queue that records each Update as the poller hands it over"""
+
+    def __init__(self, writer, bot):
+        super().__init__()
+        self.writer = writer
+        self.bot = bot
+
+    def put_nowait(self, item):
+        if isinstance(item, Update):
+            self.writer.update(self.bot, item)
+        super().put_nowait(item)
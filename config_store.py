@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Config Store
+Atomic, lock-protected access to config.json shared by the bot and web portal
+"""
+
+import os
+import json
+import copy
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+class ConfigStore:
+    """Read and write config.json without torn writes or lost updates"""
+
+    def __init__(self, path='config.json', defaults=None):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.defaults = defaults
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def lock(self):
+        """Hold an exclusive lock across threads and processes"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self):
+        """Load configuration from disk"""
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            if self.defaults is None:
+                raise
+            return copy.deepcopy(self.defaults)
+
+    def save(self, config):
+        """Save configuration atomically and bump its version"""
+        with self.lock():
+            self._write(config)
+
+    def update(self, mutate):
+        """Apply mutate(config) to the current config and save it in one locked step"""
+        with self.lock():
+            config = self.load()
+            mutate(config)
+            self._write(config)
+            return config
+
+    def stamp(self):
+        """Cheap change marker: (mtime_ns, size), or None if the file is missing"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _write(self, config):
+        """Write to a temp file in the same directory, then rename over the target"""
+        config['config_version'] = int(config.get('config_version', 0)) + 1
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.config-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(config, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(self.path):
+                # Keep the permissions of the file being replaced
+                os.chmod(tmp_path, os.stat(self.path).st_mode & 0o7777)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
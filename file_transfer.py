@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro File Transfer
+Streaming helpers for /get and /put: path allow-lists, on-the-fly gzip/tar
+packing split into upload-sized parts, and chunked downloads to disk
+"""
+
+import os
+import gzip
+import shutil
+import tarfile
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+COMPRESS_THRESHOLD = 1024 * 1024  # Don't bother compressing files smaller than this
+
+# Formats that are already compressed; gzipping them again only costs CPU
+COMPRESSED_EXTENSIONS = {
+    '.gz', '.tgz', '.zip', '.bz2', '.xz', '.zst', '.7z', '.rar',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.mkv', '.pdf',
+}
+
+
+class TransferError(Exception):
+    """A transfer was refused or failed in a way worth reporting to the user"""
+
+
+def resolve_allowed(path, roots):
+    """Resolve path (following symlinks) and make sure it lies inside one of roots"""
+    if not roots:
+        raise TransferError('File transfer is disabled. Set transfer_paths in config.json to enable it.')
+    real = os.path.realpath(os.path.expanduser(path))
+    for root in roots:
+        root = os.path.realpath(os.path.expanduser(root))
+        if os.path.commonpath([real, root]) == root:
+            return real
+    raise TransferError(f'{path} is outside the allowed transfer paths.')
+
+
+class PartWriter:
+    """Write-only file object that rolls over to a new part file every part_size bytes"""
+
+    def __init__(self, directory, name, part_size):
+        self.directory = directory
+        self.name = name
+        self.part_size = part_size
+        self.parts = []
+        self.total = 0
+        self._file = None
+        self._written = 0
+
+    def _next_part(self):
+        if self._file:
+            self._file.close()
+        path = os.path.join(self.directory, f'{self.name}.part{len(self.parts) + 1:03d}')
+        self.parts.append(path)
+        self._file = open(path, 'wb')
+        self._written = 0
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            if self._file is None or self._written >= self.part_size:
+                self._next_part()
+            n = min(len(view), self.part_size - self._written)
+            self._file.write(view[:n])
+            self._written += n
+            self.total += n
+            view = view[n:]
+        return len(data)
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        # A single part doesn't need the .partNNN suffix
+        if len(self.parts) == 1:
+            single = os.path.join(self.directory, self.name)
+            os.replace(self.parts[0], single)
+            self.parts = [single]
+
+
+def pack(path, workdir, part_size):
+    """Prepare a file or directory for upload without reading it into memory
+
+    Directories become a streamed .tar.gz; large compressible files are gzipped.
+    Output is split into parts of at most part_size bytes. Returns
+    (list of part paths, source bytes, packed bytes).
+    """
+    name = os.path.basename(path.rstrip(os.sep)) or 'root'
+
+    if os.path.isdir(path):
+        writer = PartWriter(workdir, f'{name}.tar.gz', part_size)
+        source_bytes = 0
+        with tarfile.open(fileobj=writer, mode='w|gz') as tar:
+            for dirpath, _, filenames in os.walk(path):
+                source_bytes += sum(
+                    os.path.getsize(os.path.join(dirpath, f))
+                    for f in filenames if os.path.isfile(os.path.join(dirpath, f))
+                )
+            tar.add(path, arcname=name)
+        writer.close()
+        return writer.parts, source_bytes, writer.total
+
+    if not os.path.isfile(path):
+        raise TransferError(f'{path} is not a regular file or directory.')
+
+    size = os.path.getsize(path)
+    compress = size >= COMPRESS_THRESHOLD and os.path.splitext(path)[1].lower() not in COMPRESSED_EXTENSIONS
+    if not compress and size <= part_size:
+        return [path], size, size  # Send as-is, no copy needed
+
+    writer = PartWriter(workdir, f'{name}.gz' if compress else name, part_size)
+    with open(path, 'rb') as src:
+        if compress:
+            with gzip.GzipFile(filename=name, mode='wb', fileobj=writer, compresslevel=6) as gz:
+                shutil.copyfileobj(src, gz, CHUNK_SIZE)
+        else:
+            shutil.copyfileobj(src, writer, CHUNK_SIZE)
+    writer.close()
+    return writer.parts, size, writer.total
+
+
+def download(url, destination, max_bytes):
+    """Stream url to destination in chunks, replacing it atomically; returns bytes written"""
+    import requests  # Deferred: only uploads need it, and it is slow to import
+    directory = os.path.dirname(destination)
+    fd, tmp_path = tempfile.mkstemp(prefix='.upload-', dir=directory)
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as f, requests.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise TransferError(f'Upload exceeds the {max_bytes} byte limit.')
+                f.write(chunk)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+def format_throughput(num_bytes, seconds):
+    """Human readable size and rate, e.g. '12.3 MB in 2.1s (5.9 MB/s)'"""
+    mb = num_bytes / (1024 * 1024)
+    rate = mb / seconds if seconds > 0 else mb
+    return f"{mb:.1f} MB in {seconds:.1f}s ({rate:.1f} MB/s)"
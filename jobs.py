@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Job Queue
+Every command runs as a tracked job: queued by priority, executed by a fixed
+pool of worker threads, and cancellable while queued or running
+"""
+
+import time
+import heapq
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+
+import runner
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first; within a priority, jobs run in submission order
+INTERACTIVE = 0  # /status and /sys lookups someone is waiting on
+NORMAL = 1       # /exec and /diff
+BACKGROUND = 2   # Scheduled jobs
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', NORMAL: 'normal', BACKGROUND: 'background'}
+
+
+class Job:
+    """One command: who asked for it, where it is in its life, and its process once running"""
+
+    def __init__(self, job_id, fn, command, user_id, priority, owner):
+        self.id = job_id
+        self.fn = fn
+        self.command = command
+        self.user_id = user_id
+        self.priority = priority
+        self.owner = owner  # Which bot submitted it
+        self.state = 'queued'
+        self.submitted = time.monotonic()
+        self.started = None
+        self.cancelled = False
+        self.process = None
+        self.future = Future()  # Resolves to fn's result, or None if cancelled before starting
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        """Seconds running, or seconds waiting while still queued"""
+        return time.monotonic() - (self.started or self.submitted)
+
+    def attach(self, process):
+        """Record the job's process (runner's on_start hook); kills it if cancel came first"""
+        with self._lock:
+            self.process = process
+            if self.cancelled:
+                runner.kill_tree(process)
+
+    def kill(self):
+        with self._lock:
+            self.cancelled = True
+            if self.process is not None:
+                runner.kill_tree(self.process)
+
+
+class JobQueue:
+    """Priority queue in front of a bounded pool of worker threads"""
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.jobs = {}  # Queued and running jobs by id
+        self._heap = []
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def submit(self, fn, command, user_id, priority=NORMAL, owner=None):
+        """Queue fn(job) to run on a worker; returns the Job"""
+        with self._cond:
+            job = Job(next(self._ids), fn, command, user_id, priority, owner)
+            self.jobs[job.id] = job
+            heapq.heappush(self._heap, (priority, job.id, job))
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'job-worker-{len(self._threads) + 1}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+        return job
+
+    def list(self, owner=None, user_id=None):
+        """Queued and running jobs, running ones first, then in the order they will run
+
+        owner and user_id, when given, keep only jobs of that bot / Telegram user.
+        """
+        with self._cond:
+            jobs = [job for job in self.jobs.values()
+                    if (owner is None or job.owner == owner) and (user_id is None or job.user_id == user_id)]
+        return sorted(jobs, key=lambda job: (job.state != 'running', job.priority, job.id))
+
+    def cancel(self, job_id, owner=None, user_id=None):
+        """Cancel a job; returns the state it was in ('queued' or 'running'), or None if unknown
+
+        A job of another bot (owner) or user (user_id) counts as unknown.
+        """
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if (job is None or (owner is not None and job.owner != owner)
+                    or (user_id is not None and job.user_id != user_id)):
+                return None
+            state = job.state
+            if state == 'queued':
+                # Left in the heap; the worker that pops it drops it
+                job.cancelled = True
+                job.state = 'cancelled'
+                del self.jobs[job_id]
+        if state == 'queued':
+            job.future.set_result(None)
+        else:
+            job.kill()
+        return state
+
+    def shutdown(self):
+        """Kill running jobs and drop queued ones"""
+        for job in self.list():
+            self.cancel(job.id)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                if job.cancelled:
+                    continue
+                job.state = 'running'
+                job.started = time.monotonic()
+            result = error = None
+            try:
+                result = job.fn(job)
+            except Exception as e:
+                logger.error(f"Job #{job.id} failed: {e}")
+                error = e
+            # Off the list before anyone waiting on the result can look at /jobs
+            with self._cond:
+                job.state = 'done'
+                self.jobs.pop(job.id, None)
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Latency Stats
+Per-day latency histograms and run counters by command and user, updated as
+logs are written, so percentiles never need a scan of command_logs
+"""
+
+import math
+from collections import defaultdict
+
+# Log-spaced buckets: bucket i holds durations up to BASE**i ms (about 19% wide)
+BASE = 2 ** 0.25
+PERCENTILES = (50, 95, 99)
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS command_latency (
+        day TEXT NOT NULL,
+        command_key TEXT NOT NULL,
+        telegram_user_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (day, command_key, telegram_user_id, bucket)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS command_stats (
+        day TEXT NOT NULL,
+        command_key TEXT NOT NULL,
+        telegram_user_id INTEGER NOT NULL,
+        runs INTEGER NOT NULL,
+        failures INTEGER NOT NULL,
+        timeouts INTEGER NOT NULL,
+        total_seconds REAL NOT NULL,
+        max_seconds REAL NOT NULL,
+        stdout_bytes INTEGER NOT NULL,
+        stderr_bytes INTEGER NOT NULL,
+        PRIMARY KEY (day, command_key, telegram_user_id)
+    ) WITHOUT ROWID;
+'''
+
+
+def bucket_of(seconds):
+    ms = seconds * 1000
+    return max(0, math.ceil(math.log(ms, BASE))) if ms > 1 else 0
+
+
+def bucket_limit(bucket):
+    """Upper bound of a bucket in seconds"""
+    return BASE ** bucket / 1000
+
+
+def command_key(command):
+    """Group runs by executable: full command lines are too varied to aggregate"""
+    parts = command.split()
+    return parts[0][:64] if parts else ''
+
+
+def record(db, rows):
+    """Add logged runs (as returned by audit_log.append) to the aggregates
+
+    Rows without a duration (rejected commands, file transfers) are skipped.
+    Call inside the transaction that inserts the rows.
+    """
+    buckets = defaultdict(int)
+    stats = {}
+    for row in rows:
+        seconds = row.get('duration_seconds')
+        if seconds is None:
+            continue
+        user_id = row['telegram_user_id'] if isinstance(row['telegram_user_id'], int) else 0
+        key = (row['executed_at'][:10], command_key(row['command']), user_id)
+        buckets[(*key, bucket_of(seconds))] += 1
+        s = stats.setdefault(key, [0, 0, 0, 0.0, 0.0, 0, 0])
+        s[0] += 1
+        s[1] += 0 if row['success'] else 1
+        s[2] += 1 if row.get('timed_out') else 0
+        s[3] += seconds
+        s[4] = max(s[4], seconds)
+        s[5] += row.get('stdout_bytes') or 0
+        s[6] += row.get('stderr_bytes') or 0
+    if not stats:
+        return
+
+    db.executemany('''
+        INSERT INTO command_latency (day, command_key, telegram_user_id, bucket, count) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (day, command_key, telegram_user_id, bucket) DO UPDATE SET count = count + excluded.count
+    ''', [(*key, count) for key, count in buckets.items()])
+    db.executemany('''
+        INSERT INTO command_stats (day, command_key, telegram_user_id, runs, failures, timeouts,
+                                   total_seconds, max_seconds, stdout_bytes, stderr_bytes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (day, command_key, telegram_user_id) DO UPDATE SET
+            runs = runs + excluded.runs,
+            failures = failures + excluded.failures,
+            timeouts = timeouts + excluded.timeouts,
+            total_seconds = total_seconds + excluded.total_seconds,
+            max_seconds = MAX(max_seconds, excluded.max_seconds),
+            stdout_bytes = stdout_bytes + excluded.stdout_bytes,
+            stderr_bytes = stderr_bytes + excluded.stderr_bytes
+    ''', [(*key, *s) for key, s in stats.items()])
+
+
+def percentiles(histogram, max_seconds):
+    """Percentiles from {bucket: count}, as bucket upper bounds capped at the observed max"""
+    total = sum(histogram.values())
+    result = {}
+    for p in PERCENTILES:
+        rank = math.ceil(total * p / 100)
+        seen = 0
+        for bucket in sorted(histogram):
+            seen += histogram[bucket]
+            if seen >= rank:
+                result[f'p{p}'] = round(min(bucket_limit(bucket), max_seconds), 3)
+                break
+    return result
+
+
+def summarize(db, group='command', since_day=None):
+    """Latency percentiles and counters per command ('command') or per user ('user')"""
+    column = 'command_key' if group == 'command' else 'telegram_user_id'
+    where, params = ('WHERE day >= ?', (since_day,)) if since_day else ('', ())
+
+    histograms = defaultdict(dict)
+    for key, bucket, count in db.execute(f'''
+        SELECT {column}, bucket, SUM(count) FROM command_latency {where} GROUP BY {column}, bucket
+    ''', params):
+        histograms[key][bucket] = count
+
+    summary = []
+    for row in db.execute(f'''
+        SELECT {column} AS key, SUM(runs) AS runs, SUM(failures) AS failures, SUM(timeouts) AS timeouts,
+               SUM(total_seconds) AS total_seconds, MAX(max_seconds) AS max_seconds,
+               SUM(stdout_bytes) AS stdout_bytes, SUM(stderr_bytes) AS stderr_bytes
+        FROM command_stats {where} GROUP BY {column}
+    ''', params):
+        item = {
+            'key': row['key'],
+            'runs': row['runs'],
+            'failures': row['failures'],
+            'timeouts': row['timeouts'],
+            'mean': round(row['total_seconds'] / row['runs'], 3),
+            'max': round(row['max_seconds'], 3),
+            'stdout_bytes': row['stdout_bytes'],
+            'stderr_bytes': row['stderr_bytes'],
+        }
+        item.update(percentiles(histograms[row['key']], row['max_seconds']))
+        summary.append(item)
+    summary.sort(key=lambda item: item.get('p95', 0), reverse=True)
+    return summary
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Host Metrics
+Samples CPU, load, memory and disk usage on a background thread and ships
+them to the portal's time series store
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import threading
+import itertools
+from collections import deque
+
+import api_token
+
+try:
+    import psutil
+except ImportError:  # Optional: /proc is read directly on Linux
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# Filesystems worth charting; pseudo and overlay mounts are skipped
+DISK_FS_TYPES = {'ext2', 'ext3', 'ext4', 'xfs', 'btrfs', 'zfs', 'f2fs', 'jfs', 'reiserfs', 'vfat', 'exfat', 'ntfs', 'apfs', 'hfs'}
+
+
+def read_cpu_times():
+    """(busy, total) jiffies from /proc/stat"""
+    with open('/proc/stat') as f:
+        fields = [int(v) for v in f.readline().split()[1:]]
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+    return sum(fields) - idle, sum(fields)
+
+
+def read_memory_percent():
+    info = {}
+    with open('/proc/meminfo') as f:
+        for line in f:
+            key, value = line.split(':', 1)
+            info[key] = int(value.split()[0])
+    available = info.get('MemAvailable', info.get('MemFree', 0))
+    return 100.0 * (info['MemTotal'] - available) / info['MemTotal']
+
+
+def disk_mounts():
+    """Mount points of real filesystems"""
+    if psutil:
+        return sorted({p.mountpoint for p in psutil.disk_partitions(all=False)})
+    if sys.platform.startswith('linux'):
+        mounts = set()
+        with open('/proc/mounts') as f:
+            for line in f:
+                device, mountpoint, fs_type = line.split()[:3]
+                if fs_type in DISK_FS_TYPES and not mountpoint.startswith(('/proc', '/sys', '/dev', '/run', '/snap')):
+                    mounts.add(mountpoint.replace('\\040', ' '))
+        return sorted(mounts) or ['/']
+    return [os.path.abspath(os.sep)]
+
+
+class HostSampler:
+    """Takes one reading of every host metric per call"""
+
+    def __init__(self):
+        self._cpu = None  # Previous /proc/stat reading, CPU % is a delta between calls
+        self._mounts = None
+        self._mounts_at = 0
+
+    def cpu_percent(self):
+        if psutil:
+            return psutil.cpu_percent(interval=None)
+        if not sys.platform.startswith('linux'):
+            return None
+        busy, total = read_cpu_times()
+        previous, self._cpu = self._cpu, (busy, total)
+        if previous is None or total == previous[1]:
+            return None
+        return 100.0 * (busy - previous[0]) / (total - previous[1])
+
+    def memory_percent(self):
+        if psutil:
+            return psutil.virtual_memory().percent
+        if sys.platform.startswith('linux'):
+            return read_memory_percent()
+        return None
+
+    def mounts(self):
+        # Mounts rarely change; look them up every few minutes
+        if self._mounts is None or time.monotonic() - self._mounts_at > 300:
+            self._mounts = disk_mounts()
+            self._mounts_at = time.monotonic()
+        return self._mounts
+
+    def sample(self):
+        """{series name: value} for this moment"""
+        values = {'cpu.percent': self.cpu_percent(), 'mem.percent': self.memory_percent()}
+        if hasattr(os, 'getloadavg'):
+            values['load.1m'], values['load.5m'], values['load.15m'] = os.getloadavg()
+        for mount in self.mounts():
+            try:
+                usage = shutil.disk_usage(mount)
+            except OSError:
+                continue
+            values[f'disk.percent:{mount}'] = 100.0 * usage.used / usage.total if usage.total else 0.0
+        return {name: round(value, 3) for name, value in values.items() if value is not None}
+
+
+class MetricsReporter:
+    """Samples host metrics every `interval` seconds and posts them to the portal
+
+    Samples are kept (up to a day's worth) while the portal is unreachable
+    and sent once it is back.
+    """
+
+    def __init__(self, portal_url, interval=15, portal_token=None):
+        self.portal_url = portal_url
+        self.interval = interval
+        self.portal_token = portal_token
+        self.sampler = HostSampler()
+        self._pending = deque(maxlen=int(86400 / interval) * 16)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='metrics-reporter', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        import requests
+        session = requests.Session()
+        if self.portal_token:
+            session.headers[api_token.HEADER] = self.portal_token
+        self.sampler.sample()  # Prime the CPU counters
+        while True:
+            time.sleep(self.interval)
+            now = int(time.time())
+            try:
+                for name, value in self.sampler.sample().items():
+                    self._pending.append({'name': name, 'ts': now, 'value': value})
+            except Exception as e:
+                logger.warning(f"Failed to sample host metrics: {e}")
+            if not self._pending:
+                continue
+            batch = list(itertools.islice(self._pending, 5000))  # Catch up on a backlog a piece at a time
+            try:
+                session.post(f'{self.portal_url}/api/metrics', json=batch, timeout=5).raise_for_status()
+            except requests.RequestException:
+                continue  # Portal not running; keep the samples and retry next time
+            for _ in batch:
+                self._pending.popleft()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Replay
+Feeds a capture file (see capture.py) back through the bot's handlers against
+a stubbed Telegram API and stubbed command execution, and reports handler
+latency and queueing per command
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import itertools
+import tempfile
+from collections import Counter, defaultdict, deque
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+import bot
+import jobs
+import capture
+
+
+class NullShipper:
+    """Log shipper that drops entries; the replay never talks to the portal"""
+
+    def submit(self, portal_url, entry, endpoint='/api/log'):
+        pass
+
+
+class StubRequest(BaseRequest):
+    """Answers Bot API calls locally after `latency` seconds, counting calls by method"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def result(self, method, params):
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Replay', 'username': 'replay_bot'}
+        if method == 'getFile':
+            return {'file_id': params.get('file_id'), 'file_unique_id': 'replay', 'file_path': 'replay'}
+        if method.startswith(('send', 'edit', 'copy')) and 'inline_message_id' not in params:
+            chat_id = params.get('chat_id', 0)
+            return {
+                'message_id': params.get('message_id') or next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(chat_id) if str(chat_id).lstrip('-').isdigit() else 0, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        return True
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({'ok': True, 'result': self.result(api_method, params)}).encode('utf-8')
+
+
+class ReplayManager(bot.HostManager):
+    """HostManager whose commands return their captured results after their captured duration"""
+
+    def __init__(self, config_path, results, job_queue):
+        super().__init__(config_path, log_shipper=NullShipper(), job_queue=job_queue)
+        self.results = results  # Command -> deque of captured results, in capture order
+        self.missing = 0
+
+    def execute_command(self, command, on_start=None):
+        captured = self.results.get(command)
+        if not captured:
+            self.missing += 1
+            return {'success': True, 'output': '✅ Command executed successfully (no output)', 'error': None}
+        record = captured.popleft()
+        metrics = record.get('metrics') or {}
+        time.sleep(metrics.get('duration_seconds') or 0)
+        output = record.get('output', '')
+        # Only the start of long outputs is captured; pad back to the real size
+        output += '.' * (record.get('output_chars', 0) - len(output))
+        result = {'success': record['success'], 'output': output, 'error': record.get('error'), 'metrics': metrics}
+        if 'usage' in record:
+            result['usage'] = record['usage']
+        return result
+
+    def portal_request(self, method, path, **kwargs):
+        return None
+
+
+def label(update):
+    """Group updates by what they ask for: the command, the button, or the kind of message"""
+    if update.callback_query:
+        return f"button:{(update.callback_query.data or '').split(':')[0]}"
+    message = update.effective_message
+    if message is None:
+        return 'other'
+    if message.text and message.text.startswith('/'):
+        return message.text.split()[0].split('@')[0]
+    if message.document:
+        return 'document'
+    return 'text'
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def load_capture(path):
+    """(configs by bot, updates as (t, bot, data), results by bot and command)"""
+    configs, updates = {}, []
+    results = defaultdict(lambda: defaultdict(deque))
+    for record in capture.read_records(path):
+        if record['type'] == 'config':
+            configs.setdefault(record.get('bot'), record['config'])
+        elif record['type'] == 'update':
+            updates.append((record['t'], record.get('bot'), record['update']))
+        elif record['type'] == 'result':
+            results[record.get('bot')][record['command']].append(record)
+    return configs, updates, results
+
+
+def replay_config(config, workdir):
+    """Captured settings, with anything that would touch the network or the host disabled"""
+    return dict(
+        config,
+        telegram_token='0:replay',
+        transfer_paths=[workdir],  # /get and /put only see the empty work directory
+        shell='cat',  # /shell sessions echo instead of running anything
+    )
+
+
+async def replay(path, speed, api_latency):
+    """Replay a capture; returns the report dict"""
+    configs, updates, results = load_capture(path)
+    if not updates:
+        raise SystemExit(f"No updates in {path}")
+    workdir = tempfile.mkdtemp(prefix='telecommand-replay-')
+    first_config = next(iter(configs.values()), {})
+    job_queue = jobs.JobQueue(workers=first_config.get('job_workers', 4))
+    applications, requests_by_bot, managers = {}, {}, []
+    enqueued = {}
+    timings = defaultdict(list)  # label -> [(queue seconds, handler seconds)]
+    errors = Counter()
+
+    for name in {bot_name for _, bot_name, _ in updates}:
+        config_path = os.path.join(workdir, f'config-{len(applications)}.json')
+        with open(config_path, 'w') as f:
+            json.dump(replay_config(configs.get(name, {}), workdir), f)
+        manager = ReplayManager(config_path, results[name], job_queue)
+        request = StubRequest(api_latency)
+        application = bot.build_application(manager, request=request)
+        process_update = application.process_update
+
+        async def timed(update, process_update=process_update, name=name):
+            started = time.perf_counter()
+            try:
+                await process_update(update)
+            finally:
+                queued = started - enqueued.pop((name, update.update_id), started)
+                timings[label(update)].append((queued, time.perf_counter() - started))
+
+        async def on_error(update, context):
+            errors[label(update) if isinstance(update, Update) else 'other'] += 1
+            logging.getLogger('replay').error(f"Handler error: {context.error!r}")
+
+        application.process_update = timed
+        application.add_error_handler(on_error)
+        applications[name] = application
+        requests_by_bot[name] = request
+        managers.append(manager)
+
+    try:
+        for application in applications.values():
+            await application.initialize()
+            await application.start()
+
+        started = time.perf_counter()
+        first_t = updates[0][0]
+        lag = 0.0
+        for t, name, data in updates:
+            if speed:
+                due = started + (t - first_t) / speed
+                if due > time.perf_counter():
+                    await asyncio.sleep(due - time.perf_counter())
+                lag = max(lag, time.perf_counter() - due)
+            application = applications[name]
+            update = Update.de_json(data, application.bot)
+            enqueued[(name, update.update_id)] = time.perf_counter()
+            await application.update_queue.put(update)
+        for application in applications.values():
+            await application.update_queue.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        for application in applications.values():
+            for user_id in list(application.bot_data['shells'].sessions):
+                application.bot_data['shells'].close(user_id)
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+        job_queue.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    handlers = {}
+    for name, samples in sorted(timings.items()):
+        queued = sorted(q for q, _ in samples)
+        handled = sorted(h for _, h in samples)
+        handlers[name] = {
+            'count': len(samples),
+            'queue_p50': percentile(queued, 0.5), 'queue_p95': percentile(queued, 0.95), 'queue_max': queued[-1],
+            'handler_p50': percentile(handled, 0.5), 'handler_p95': percentile(handled, 0.95),
+            'handler_max': handled[-1],
+            'errors': errors[name],
+        }
+    handled = sorted(h for samples in timings.values() for _, h in samples)
+    queued = sorted(q for samples in timings.values() for q, _ in samples)
+    api_calls = sum((request.calls for request in requests_by_bot.values()), Counter())
+    return {
+        'updates': len(updates),
+        'speed': speed,
+        'capture_seconds': round(updates[-1][0] - first_t, 3),
+        'replay_seconds': round(elapsed, 3),
+        'max_feed_lag': round(lag, 3),
+        'queue_p95': percentile(queued, 0.95),
+        'handler_p95': percentile(handled, 0.95),
+        'missing_results': sum(manager.missing for manager in managers),
+        'handlers': handlers,
+        'api_calls': dict(api_calls.most_common()),
+    }
+
+
+def print_report(report):
+    speed = f"{report['speed']:g}x" if report['speed'] else 'full speed'
+    print(f"Replayed {report['updates']} updates at {speed} in {report['replay_seconds']:.2f} s "
+          f"(captured over {report['capture_seconds']:.2f} s, feed lag max {report['max_feed_lag'] * 1000:.0f} ms)")
+    if report['missing_results']:
+        print(f"{report['missing_results']} commands had no captured result and returned instantly")
+    columns = ('queue_p50', 'queue_p95', 'queue_max', 'handler_p50', 'handler_p95', 'handler_max')
+    print(f"\n{'Handler':<16}{'n':>6}" + ''.join(f"{c.replace('_', ' '):>14}" for c in columns) + f"{'errors':>8}")
+    for name, row in report['handlers'].items():
+        print(f"{name:<16}{row['count']:>6}" + ''.join(f"{row[c] * 1000:>12.1f}ms" for c in columns) + f"{row['errors']:>8}")
+    print('\nAPI calls: ' + ', '.join(f'{method} {count}' for method, count in report['api_calls'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a bot capture file and report handler latency')
+    parser.add_argument('capture', help='Capture file written with --capture or config capture.path')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Feed updates N times faster than captured; 0 sends them all at once')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='Seconds each stubbed Bot API call takes')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--max-p95', type=float,
+                        help='Exit with status 1 if handler p95 exceeds this many seconds (for git bisect run)')
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show the bot's own logging")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    report = asyncio.run(replay(args.capture, args.speed, args.api_latency))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.max_p95 is not None and report['handler_p95'] > args.max_p95:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Process Runner
+Runs shell commands while streaming their output into bounded buffers, so
+memory use stays flat no matter how much a command prints
+"""
+
+import os
+import time
+import shlex
+import shutil
+import signal
+import threading
+import selectors
+import subprocess
+from collections import deque
+
+POSIX = os.name == 'posix'
+READ_SIZE = 65536
+
+# Anything the shell would expand, redirect, chain or treat specially
+SHELL_CHARS = frozenset('|&;<>()$`\\*?[]{}~#\n')
+# Names that only mean something to the shell (some also exist as stub binaries)
+SHELL_WORDS = frozenset({
+    '!', '.', ':', '[[', 'alias', 'bg', 'builtin', 'case', 'cd', 'command', 'declare', 'eval', 'exec',
+    'exit', 'export', 'fg', 'for', 'function', 'hash', 'history', 'if', 'jobs', 'let', 'local',
+    'read', 'readonly', 'return', 'select', 'set', 'shift', 'source', 'time', 'times', 'trap',
+    'type', 'typeset', 'ulimit', 'umask', 'unalias', 'unset', 'until', 'wait', 'while',
+})
+_executables = {}  # (name, PATH) -> absolute path
+
+
+def which(name):
+    """shutil.which with the result cached per PATH value; misses are not cached"""
+    key = (name, os.environ.get('PATH', ''))
+    path = _executables.get(key)
+    if path is None:
+        path = shutil.which(name)
+        if path:
+            _executables[key] = path
+    return path
+
+
+def direct_argv(command):
+    """argv to exec a simple command without a shell, or None if it needs one
+
+    Only plain words and quoting are handled here; any metacharacter, shell
+    keyword or builtin, or an unknown program leaves the command to /bin/sh.
+    """
+    if not POSIX or SHELL_CHARS.intersection(command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    if not argv or argv[0] in SHELL_WORDS or '=' in argv[0]:  # VAR=value prefixes an assignment
+        return None
+    path = argv[0] if '/' in argv[0] else which(argv[0])
+    if not path:
+        return None
+    return [path, *argv[1:]]
+
+
+class BoundedBuffer:
+    """Keeps the first head_limit bytes and a ring of the last tail_limit bytes"""
+
+    def __init__(self, head_limit, tail_limit):
+        self.head_limit = head_limit
+        self.tail_limit = tail_limit
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_size = 0
+        self.total = 0
+
+    def write(self, data):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data or self.tail_limit <= 0:
+            return
+        self.tail.append(data)
+        self.tail_size += len(data)
+        # Drop whole chunks from the front, then trim the oldest remaining one
+        while self.tail_size - len(self.tail[0]) >= self.tail_limit:
+            self.tail_size -= len(self.tail.popleft())
+        excess = self.tail_size - self.tail_limit
+        if excess > 0:
+            self.tail[0] = self.tail[0][excess:]
+            self.tail_size -= excess
+
+    @property
+    def truncated(self):
+        return self.total > len(self.head) + self.tail_size
+
+    def getvalue(self):
+        """Decoded output, with a marker where bytes were dropped"""
+        head = bytes(self.head).decode('utf-8', 'replace')
+        tail = b''.join(self.tail).decode('utf-8', 'replace')
+        if not self.truncated:
+            return head + tail
+        omitted = self.total - len(self.head) - self.tail_size
+        return f"{head}\n\n... [{omitted} bytes omitted] ...\n\n{tail}"
+
+
+def kill_tree(process):
+    """Kill the command and everything it started"""
+    try:
+        if POSIX:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _pump_posix(process, buffers, deadline, max_bytes):
+    """Read both pipes with a selector until EOF, deadline or byte ceiling"""
+    with selectors.DefaultSelector() as selector:
+        for pipe in buffers:
+            selector.register(pipe, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return 'timeout'
+            for key, _ in selector.select(remaining):
+                data = os.read(key.fd, READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    continue
+                buffers[key.fileobj].write(data)
+                if max_bytes and sum(b.total for b in buffers.values()) > max_bytes:
+                    return 'size'
+    return None
+
+
+def _pump_threads(process, buffers, deadline, max_bytes):
+    """Windows fallback: one reader thread per pipe"""
+    over_limit = threading.Event()
+    lock = threading.Lock()
+
+    def reader(pipe, buffer):
+        for data in iter(lambda: pipe.read1(READ_SIZE), b''):
+            with lock:
+                buffer.write(data)
+                if max_bytes and sum(b.total for b in buffers.values()) > max_bytes:
+                    over_limit.set()
+                    return
+
+    threads = [threading.Thread(target=reader, args=item, daemon=True) for item in buffers.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            if over_limit.is_set():
+                return 'size'
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return 'timeout'
+            thread.join(min(remaining, 0.1))
+    return 'size' if over_limit.is_set() else None
+
+
+def _reap_posix(process, deadline):
+    """Wait for the child with os.wait4, killing it at the deadline; returns (status, rusage, timed_out)"""
+    delay = 0.001
+    while True:
+        pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            return status, rusage, False
+        if time.monotonic() >= deadline:
+            # Output is closed but the command is still running
+            kill_tree(process)
+            _, status, rusage = os.wait4(process.pid, 0)
+            return status, rusage, True
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+
+def spawn(command, direct=True, wrapper=None, **kwargs):
+    """Popen a command line, exec'ing simple commands directly instead of via /bin/sh
+
+    wrapper, if given, is an argv prefix that ends by exec'ing the argv
+    appended to it (see sandbox._shim).
+    """
+    argv = direct_argv(command) if direct else None
+    if wrapper:
+        return subprocess.Popen([*wrapper, *(argv or ['/bin/sh', '-c', command])], **kwargs)
+    if argv:
+        try:
+            return subprocess.Popen(argv, **kwargs)
+        except (FileNotFoundError, PermissionError, NotADirectoryError):
+            # Binary moved or lost its permissions since it was looked up; let the shell report it
+            _executables.clear()
+    return subprocess.Popen(command, shell=True, **kwargs)
+
+
+def run_process(command, timeout, head_bytes=32768, tail_bytes=32768, max_bytes=None, on_start=None,
+                direct=True, wrapper=None):
+    """Run a command line, keeping bounded stdout/stderr
+
+    Simple commands are exec'd directly (see direct_argv) unless direct is
+    False; everything else runs through the shell, behind wrapper if given
+    (see spawn). The command is killed when it runs past `timeout` seconds or
+    its combined output exceeds `max_bytes`.
+    on_start, if given, is called with the Popen object once the command is
+    running (e.g. so it can be cancelled); if it raises, the command is killed. Returns a dict with returncode,
+    stdout, stderr, their byte counts, timed_out, output_limited, wall_seconds
+    and, on POSIX, the child's rusage.
+    """
+    start = time.monotonic()
+    process = spawn(
+        command,
+        direct=direct,
+        wrapper=wrapper,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=POSIX,  # Own process group so a kill takes the whole pipeline
+    )
+    if on_start:
+        try:
+            on_start(process)
+        except BaseException:
+            kill_tree(process)
+            process.wait()
+            process.stdout.close()
+            process.stderr.close()
+            raise
+    buffers = {
+        process.stdout: BoundedBuffer(head_bytes, tail_bytes),
+        process.stderr: BoundedBuffer(head_bytes, tail_bytes),
+    }
+
+    pump = _pump_posix if POSIX else _pump_threads
+    stopped = pump(process, buffers, start + timeout, max_bytes)
+    if stopped:
+        kill_tree(process)
+
+    rusage = None
+    if POSIX:
+        # Reap the child ourselves to get its own resource usage
+        status, rusage, late = _reap_posix(process, start + timeout)
+        if late:
+            stopped = 'timeout'
+        process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    else:
+        try:
+            process.wait(max(0, start + timeout - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            stopped = 'timeout'
+            kill_tree(process)
+            process.wait()
+    process.stdout.close()
+    process.stderr.close()
+
+    out, err = buffers[process.stdout], buffers[process.stderr]
+    return {
+        'returncode': process.returncode,
+        'stdout': out.getvalue(),
+        'stderr': err.getvalue(),
+        'stdout_bytes': out.total,
+        'stderr_bytes': err.total,
+        'timed_out': stopped == 'timeout',
+        'output_limited': stopped == 'size',
+        'wall_seconds': round(time.monotonic() - start, 3),
+        'rusage': rusage,
+    }
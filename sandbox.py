@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Sandbox
+Runs shell commands under per-process resource limits (ulimit) and,
+optionally, inside their own cgroup v2 with cpu.max/io.max/memory.max
+"""
+
+import os
+import sys
+import uuid
+import logging
+
+import runner
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Is the sandbox usable on this platform? Limits are set by /bin/sh's ulimit,
+# whose options and units are only relied on for Linux shells (dash, bash)
+AVAILABLE = resource is not None and sys.platform.startswith('linux')
+
+# Limit names in config.json -> (rlimit, multiplier to the kernel unit)
+RLIMITS = {
+    'cpu_seconds': ('RLIMIT_CPU', 1),
+    'memory_mb': ('RLIMIT_AS', 1024 * 1024),
+    'open_files': ('RLIMIT_NOFILE', 1),
+    'file_size_mb': ('RLIMIT_FSIZE', 1024 * 1024),
+    'processes': ('RLIMIT_NPROC', 1),
+}
+
+# rlimit -> (ulimit options to try in turn, bytes per ulimit unit)
+ULIMIT_OPTIONS = {
+    'RLIMIT_CPU': (('-t',), 1),
+    'RLIMIT_AS': (('-v',), 1024),
+    'RLIMIT_NOFILE': (('-n',), 1),
+    'RLIMIT_FSIZE': (('-f',), 512),
+    'RLIMIT_NPROC': (('-u', '-p'), 1),  # bash says -u, dash -p
+}
+
+# Limit names in config.json -> cgroup v2 control files
+CGROUP_FILES = {
+    'cpu_max': 'cpu.max',
+    'memory_max': 'memory.max',
+    'io_max': 'io.max',
+    'pids_max': 'pids.max',
+}
+
+
+def _create_cgroup(root, limits):
+    """Create a per-command cgroup under root and apply limits; returns its path or None"""
+    path = os.path.join(root, f'cmd-{uuid.uuid4().hex[:12]}')
+    try:
+        os.mkdir(path)
+        for key, filename in CGROUP_FILES.items():
+            if key in limits:
+                with open(os.path.join(path, filename), 'w') as f:
+                    f.write(str(limits[key]))
+        return path
+    except OSError as e:
+        logger.warning(f"cgroup setup failed under {root}, using rlimits only: {e}")
+        _remove_cgroup(path)
+        return None
+
+
+def _read_cgroup_usage(path):
+    """Collect CPU and peak memory accounting from a finished cgroup"""
+    usage = {}
+    try:
+        with open(os.path.join(path, 'cpu.stat')) as f:
+            for line in f:
+                key, value = line.split()
+                if key == 'usage_usec':
+                    usage['cgroup_cpu_seconds'] = int(value) / 1e6
+        peak = os.path.join(path, 'memory.peak')
+        if os.path.exists(peak):
+            with open(peak) as f:
+                usage['cgroup_memory_peak_mb'] = int(f.read().strip()) / (1024 * 1024)
+    except (OSError, ValueError) as e:
+        logger.debug(f"Could not read cgroup usage from {path}: {e}")
+    return usage
+
+
+def _remove_cgroup(path):
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def _rlimits(limits):
+    """(rlimit name, value) pairs for the configured limits, capped at our own hard limits"""
+    rlimits = []
+    for key, (name, scale) in RLIMITS.items():
+        if key in limits:
+            value = int(limits[key] * scale)
+            _, hard = resource.getrlimit(getattr(resource, name))
+            if hard != resource.RLIM_INFINITY:
+                value = min(value, hard)
+            rlimits.append((name, value))
+    return rlimits
+
+
+def _shim(rlimits, cgroup_path):
+    """argv prefix that joins the cgroup, sets the limits, then execs the argv appended to it
+
+    Everything happens in the child before the command is exec'd, so the
+    command and all it starts are confined from their first instruction,
+    without a preexec_fn (not safe in the multi-threaded bot). If any step
+    fails the command isn't run and the shell exits with 126.
+    """
+    steps = []
+    if cgroup_path:
+        steps.append('echo $$ > "$0"/cgroup.procs')
+    for name, value in rlimits:
+        options, unit = ULIMIT_OPTIONS[name]
+        tries = [f'ulimit {option} {value // unit}' for option in options]
+        steps.append(tries[0] if len(tries) == 1 else '{ ' + ' 2>/dev/null || '.join(tries) + '; }')
+    script = ''.join(f'{step} || exit 126; ' for step in steps) + 'exec "$@"'
+    return ['/bin/sh', '-c', script, cgroup_path or 'sandbox']
+
+
+def run_sandboxed(command, timeout, limits, cgroup_root=None, on_start=None, **output_limits):
+    """Run a shell command under resource limits
+
+    output_limits (and other run_process options such as direct) are passed on
+    to runner.run_process, as is on_start. Returns its result with an added
+    usage dict (CPU seconds, peak RSS and, with cgroups, cgroup accounting).
+    """
+    if not AVAILABLE:
+        raise RuntimeError('Sandboxed execution requires a POSIX system')
+
+    cgroup_path = _create_cgroup(cgroup_root, limits) if cgroup_root else None
+    wrapper = _shim(_rlimits(limits), cgroup_path)
+
+    try:
+        result = runner.run_process(command, timeout, on_start=on_start, wrapper=wrapper, **output_limits)
+    finally:
+        usage = _read_cgroup_usage(cgroup_path) if cgroup_path else {}
+        if cgroup_path:
+            _remove_cgroup(cgroup_path)
+
+    rusage = result['rusage']
+    usage.update({
+        'wall_seconds': result['wall_seconds'],
+        'cpu_seconds': round(rusage.ru_utime + rusage.ru_stime, 3),
+        # ru_maxrss is in bytes on macOS and KB elsewhere
+        'max_rss_mb': round(rusage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+    })
+    result['usage'] = usage
+    return result
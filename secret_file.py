@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Secret Files
+Random keys kept in small files that several processes (bot, portal
+workers) may try to create at the same moment
+"""
+
+import os
+import secrets
+
+
+def load_or_create_secret(path, nbytes=32):
+    """Hex secret stored in path, created with nbytes of randomness if the file doesn't exist yet
+
+    The file is written under a temporary name and hard-linked into place, so
+    processes starting at the same moment all read the same complete secret;
+    whoever links first wins and the others read its file.
+    """
+    if not os.path.exists(path):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(nbytes))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass  # Another process got there first; use its secret
+        finally:
+            os.unlink(tmp_path)
+    with open(path) as f:
+        return f.read().strip()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Send Queue
+Central outbound queue for Bot API calls: per-chat and global rate shaping,
+retry on flood control, coalescing of edits and merging of short replies
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+EDIT_ENDPOINTS = {'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption'}
+
+
+class TokenBucket:
+    """Allows `rate` calls per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+    def pause(self, seconds):
+        """Stop handing out tokens for a while, e.g. after a 429"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _Request:
+    __slots__ = ('callback', 'args', 'kwargs', 'endpoint', 'data', 'mergeable', 'future', 'followers')
+
+    def __init__(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.endpoint = endpoint
+        self.data = data
+        # Only fire-and-forget messages may be merged: callers that go on to
+        # edit the returned message need it to contain just their own text
+        self.mergeable = (
+            endpoint == 'sendMessage' and 'reply_markup' not in data
+            and bool(rate_limit_args and rate_limit_args.get('merge'))
+        )
+        self.future = asyncio.get_running_loop().create_future()
+        self.followers = []  # Futures of requests folded into this one
+
+    def resolve(self, result=None, error=None):
+        for future in [self.future, *self.followers]:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class SendQueue(BaseRateLimiter):
+    """Rate limiter plugged into the Application so every Bot API call goes through it
+
+    Calls that target a chat are queued per chat and sent one at a time by a
+    worker, paced by a per-chat bucket (slower for groups) and a global bucket.
+    While a call waits its turn, a newer edit of the same message replaces it.
+    Messages sent with rate_limit_args={'merge': True} that queue up behind each
+    other are merged into a single message.
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3, group_per_minute=20, max_retries=3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_per_minute = group_per_minute
+        self.max_retries = max_retries
+        self.queues = {}
+        self.buckets = {}
+        self.workers = {}
+        self.stats = {'sent': 0, 'coalesced': 0, 'merged': 0, 'retried': 0}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        for worker in self.workers.values():
+            worker.cancel()
+        self.workers.clear()
+
+    def _bucket(self, chat_id):
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            # Negative ids are groups and channels, which Telegram limits per minute
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_per_minute / 60, self.group_per_minute)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.buckets[chat_id] = bucket
+        return bucket
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            # getUpdates, answerCallbackQuery and friends aren't chat-bound
+            return await self._call(callback, args, kwargs, None)
+
+        request = _Request(callback, args, kwargs, endpoint, data, rate_limit_args)
+        self.queues.setdefault(chat_id, deque()).append(request)
+        worker = self.workers.get(chat_id)
+        if worker is None or worker.done():
+            self.workers[chat_id] = asyncio.get_running_loop().create_task(self._drain(chat_id))
+        return await request.future
+
+    async def _drain(self, chat_id):
+        """Send everything queued for one chat, in order"""
+        queue = self.queues[chat_id]
+        bucket = self._bucket(chat_id)
+        while queue:
+            request = queue.popleft()
+            if self._superseded(request, queue):
+                continue
+            batch = self._merge(request, queue)
+            await self.global_bucket.acquire()
+            await bucket.acquire()
+            try:
+                result = await self._call(request.callback, request.args, request.kwargs, bucket)
+            except Exception as e:
+                for item in batch:
+                    item.resolve(error=e)
+            else:
+                for item in batch:
+                    item.resolve(result)
+        del self.queues[chat_id]
+        self.workers.pop(chat_id, None)
+
+    def _superseded(self, request, queue):
+        """Fold an edit into a later queued edit of the same message"""
+        if request.endpoint not in EDIT_ENDPOINTS:
+            return False
+        key = (request.data.get('chat_id'), request.data.get('message_id'), request.data.get('inline_message_id'))
+        for later in queue:
+            if later.endpoint == request.endpoint and key == (
+                later.data.get('chat_id'), later.data.get('message_id'), later.data.get('inline_message_id')
+            ):
+                later.followers += [request.future, *request.followers]
+                self.stats['coalesced'] += 1
+                return True
+        return False
+
+    def _merge(self, request, queue):
+        """Append consecutive mergeable messages with the same options to request"""
+        batch = [request]
+        if not request.mergeable:
+            return batch
+        options = {k: v for k, v in request.data.items() if k != 'text'}
+        texts = [request.data['text']]
+        length = len(texts[0])
+        while queue:
+            nxt = queue[0]
+            if not nxt.mergeable or {k: v for k, v in nxt.data.items() if k != 'text'} != options:
+                break
+            if length + 2 + len(nxt.data['text']) > MAX_MESSAGE_LENGTH:
+                break
+            queue.popleft()
+            texts.append(nxt.data['text'])
+            length += 2 + len(nxt.data['text'])
+            batch.append(nxt)
+        if len(batch) > 1:
+            # data is the dict the request is built from, so this changes what gets sent
+            request.data['text'] = '\n\n'.join(texts)
+            self.stats['merged'] += len(batch) - 1
+        return batch
+
+    async def _call(self, callback, args, kwargs, bucket):
+        """Make the API call, waiting out flood control up to max_retries times"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await callback(*args, **kwargs)
+                self.stats['sent'] += 1
+                return result
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                logger.warning(f"Flood control: retrying in {delay}s")
+                self.stats['retried'] += 1
+                # A 429 for one chat usually means the whole bot is going too fast
+                self.global_bucket.pause(delay)
+                if bucket is not None:
+                    bucket.pause(delay)
+                await asyncio.sleep(delay)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Session Store
+Portal sessions kept server-side in SQLite: the cookie only carries a signed
+session id, so every worker process sees the same sessions and a user can be
+logged out everywhere by deleting their rows
+"""
+
+import os
+import json
+import time
+import secrets
+import threading
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from secret_file import load_or_create_secret
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS portal_sessions (
+        id TEXT PRIMARY KEY,
+        user_id INTEGER,
+        data TEXT NOT NULL,
+        expires_at INTEGER NOT NULL
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_portal_sessions_expires ON portal_sessions(expires_at);
+    CREATE INDEX IF NOT EXISTS idx_portal_sessions_user ON portal_sessions(user_id);
+'''
+
+
+def load_secret_key(path):
+    """Session signing key: $TELECOMMAND_SECRET_KEY, else a key file created on first use"""
+    env_key = os.environ.get('TELECOMMAND_SECRET_KEY')
+    if env_key:
+        return env_key
+    return load_or_create_secret(path, 32)
+
+
+class TTLCache:
+    """Small thread-safe LRU cache with per-entry expiry"""
+
+    def __init__(self, maxsize=256, ttl=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return cached value, or default if missing or expired"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose value matches predicate"""
+        with self._lock:
+            for key in [key for key, (value, _) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that knows its id and stored owner, and whether it was changed"""
+
+    def __init__(self, data=None, sid=None, expires_at=0):
+        def on_update(self):
+            self.modified = True
+        super().__init__(data, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.user_id = self.get('user_id')  # Owner of the stored row
+        self.modified = False
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """Flask session interface on the portal_sessions table
+
+    A session is read with one indexed query, which also picks up the user's
+    current username and role; sessions of deleted or disabled users are
+    dropped. Each worker then keeps the row in a TTL cache for cache_ttl
+    seconds, so most requests check auth from memory. revoke() and session
+    writes invalidate the cache in this worker; other workers see the change
+    once their copy expires. Rows are only written when the session changes or
+    its expiry (sliding, PERMANENT_SESSION_LIFETIME) is more than
+    refresh_interval old.
+    """
+
+    def __init__(self, connect, refresh_interval=3600, prune_interval=3600, cache_ttl=5):
+        self.connect = connect
+        self.refresh_interval = refresh_interval
+        self.prune_interval = prune_interval
+        self.cache = TTLCache(maxsize=1024, ttl=cache_ttl)
+        self._pruned_at = 0
+
+    def signer(self, app):
+        return Signer(app.secret_key, salt='portal-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return ServerSession()
+        try:
+            sid = self.signer(app).unsign(cookie).decode('ascii')
+        except BadSignature:
+            return ServerSession()
+
+        row = self.cache.get(sid)
+        if row is None or row[1] <= time.time():
+            db = self.connect()
+            try:
+                row = db.execute('''
+                    SELECT s.data, s.expires_at, u.username, u.role, u.is_active, s.user_id
+                    FROM portal_sessions s LEFT JOIN portal_users u ON u.id = s.user_id
+                    WHERE s.id = ? AND s.expires_at > ?
+                ''', (sid, int(time.time()))).fetchone()
+            finally:
+                db.close()
+            if row is None:
+                return ServerSession()
+            row = tuple(row)
+            self.cache.set(sid, row)
+        data, expires_at, username, role, is_active, _ = row
+        data = json.loads(data)
+        if 'user_id' in data:
+            if not is_active:
+                # User deleted or disabled since logging in: drop the session
+                session = ServerSession(sid=sid)
+                session.user_id = data['user_id']
+                session.modified = True
+                return session
+            data.update(username=username, role=role)
+        return ServerSession(data, sid, expires_at)
+
+    def lifetime(self, app, session):
+        # Anonymous sessions only carry flash messages; don't keep them around
+        if session.get('user_id') is None:
+            return self.refresh_interval
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain, path = self.get_cookie_domain(app), self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.sid and session.modified:  # Logged out or revoked
+                self.write([('DELETE FROM portal_sessions WHERE id = ?', (session.sid,))], session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = int(time.time())
+        lifetime = self.lifetime(app, session)
+        if session.modified:
+            old_sid = session.sid
+            statements = []
+            if session.sid is None or session.get('user_id') != session.user_id:
+                # A fresh id whenever the user changes (login), so a planted id is useless
+                if session.sid:
+                    statements.append(('DELETE FROM portal_sessions WHERE id = ?', (session.sid,)))
+                session.sid = secrets.token_urlsafe(32)
+            statements.append((
+                'INSERT OR REPLACE INTO portal_sessions (id, user_id, data, expires_at) VALUES (?, ?, ?, ?)',
+                (session.sid, session.get('user_id'), json.dumps(dict(session)), now + lifetime)
+            ))
+            self.write(statements, old_sid)
+        elif session.sid and session.expires_at - now < lifetime - self.refresh_interval:
+            self.write([('UPDATE portal_sessions SET expires_at = ? WHERE id = ?', (now + lifetime, session.sid))],
+                       session.sid)
+        else:
+            return
+
+        response.set_cookie(
+            name,
+            self.signer(app).sign(session.sid).decode('ascii'),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def revoke(self, db, user_id, keep=None):
+        """Delete a user's sessions, except the one with id `keep`; call inside a transaction"""
+        db.execute('DELETE FROM portal_sessions WHERE user_id = ? AND id IS NOT ?', (user_id, keep))
+        self.cache.invalidate_where(lambda row: row[5] == user_id)
+
+    def write(self, statements, sid=None):
+        """Run session writes in one transaction, pruning expired sessions now and then
+
+        The cached copy of session `sid` is dropped once the writes are committed.
+        """
+        db = self.connect()
+        try:
+            for sql, params in statements:
+                db.execute(sql, params)
+            if time.time() - self._pruned_at > self.prune_interval:
+                self._pruned_at = time.time()
+                db.execute('DELETE FROM portal_sessions WHERE expires_at <= ?', (int(time.time()),))
+            db.commit()
+        finally:
+            db.close()
+        if sid:
+            self.cache.invalidate(sid)
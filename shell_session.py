@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Shell Sessions
+Long-lived PTY-backed shells, one per user, driven from the bot's event loop
+"""
+
+import os
+import re
+import time
+import signal
+import asyncio
+import logging
+import subprocess
+
+try:
+    import pty
+    import termios
+except ImportError:  # Windows
+    pty = None
+
+logger = logging.getLogger(__name__)
+
+AVAILABLE = pty is not None
+
+# Strip terminal colour/cursor sequences before sending output to Telegram
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b\][^\x07]*\x07|\r')
+
+
+class ShellSession:
+    """A shell running on a pseudo-terminal, with output collected for flushing"""
+
+    MAX_PENDING = 65536  # Bytes of unsent output kept; older output is dropped
+
+    def __init__(self, user_id, chat_id, shell, on_output, flush_interval=1.0):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.on_output = on_output
+        self.flush_interval = flush_interval
+        self.pending = bytearray()
+        self.dropped = 0
+        self.last_active = time.monotonic()
+        self.flush_task = None
+
+        master, slave = pty.openpty()
+        # No echo: the user already sees what they typed in the chat
+        attrs = termios.tcgetattr(slave)
+        attrs[3] &= ~termios.ECHO
+        termios.tcsetattr(slave, termios.TCSANOW, attrs)
+
+        env = dict(os.environ, TERM='dumb', PS1='$ ', PAGER='cat', GIT_PAGER='cat')
+        # Without line editing, readline would discard input typed before it starts
+        argv = [shell, '--noediting', '-i'] if os.path.basename(shell) == 'bash' else [shell, '-i']
+        self.process = subprocess.Popen(
+            # The PTY must be the controlling terminal so Ctrl+C reaches the foreground job. A new
+            # session leader gets it by opening the terminal, so reopen it by name before the exec
+            ['/bin/sh', '-c', 'exec "$@" <"$0" >"$0" 2>&1', os.ttyname(slave), *argv],
+            stdin=slave, stdout=slave, stderr=slave,
+            env=env,
+            start_new_session=True,
+            close_fds=True,
+        )
+        os.close(slave)
+        self.master = master
+        os.set_blocking(master, False)
+        asyncio.get_running_loop().add_reader(master, self._on_readable)
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.master, 65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''  # EIO: the shell exited
+        if not data:
+            asyncio.get_running_loop().remove_reader(self.master)
+            self._schedule_flush(0)
+            return
+        self.pending += data
+        if len(self.pending) > self.MAX_PENDING:
+            excess = len(self.pending) - self.MAX_PENDING
+            del self.pending[:excess]
+            self.dropped += excess
+        # Coalesce bursts of output into one message per flush interval
+        self._schedule_flush(self.flush_interval)
+
+    def _schedule_flush(self, delay):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self._flush_after(delay))
+
+    async def _flush_after(self, delay):
+        await asyncio.sleep(delay)
+        if not self.pending:
+            return
+        text = ANSI_ESCAPE.sub('', self.pending.decode('utf-8', 'replace'))
+        if self.dropped:
+            text = f"... [{self.dropped} bytes dropped] ...\n{text}"
+        self.pending.clear()
+        self.dropped = 0
+        try:
+            await self.on_output(self.chat_id, text)
+        except Exception as e:
+            logger.error(f"Failed to send shell output to {self.chat_id}: {e}")
+
+    def send(self, line):
+        """Send one line of input to the shell"""
+        self.last_active = time.monotonic()
+        os.write(self.master, (line + '\n').encode())
+
+    def interrupt(self):
+        """Send Ctrl+C to the foreground job"""
+        self.last_active = time.monotonic()
+        os.write(self.master, b'\x03')
+
+    def close(self):
+        """Terminate the shell and everything started from it"""
+        try:
+            asyncio.get_running_loop().remove_reader(self.master)
+        except (RuntimeError, ValueError):
+            pass
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.wait()
+        os.close(self.master)
+
+
+class ShellManager:
+    """Tracks per-user shell sessions, enforcing a session cap and idle timeout"""
+
+    def __init__(self, on_output, on_closed, shell='/bin/sh', max_sessions=3, idle_timeout=600):
+        self.on_output = on_output
+        self.on_closed = on_closed
+        self.shell = shell
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.reaper = None
+
+    def get(self, user_id):
+        """Return the user's live session, or None"""
+        session = self.sessions.get(user_id)
+        if session is not None and not session.alive:
+            self.close(user_id)
+            return None
+        return session
+
+    def open(self, user_id, chat_id):
+        """Start a session for the user; raises RuntimeError when at capacity"""
+        existing = self.get(user_id)
+        if existing is not None:
+            return existing
+        if len(self.sessions) >= self.max_sessions:
+            raise RuntimeError(f"Too many open shell sessions (max {self.max_sessions})")
+        session = ShellSession(user_id, chat_id, self.shell, self.on_output)
+        self.sessions[user_id] = session
+        if self.reaper is None or self.reaper.done():
+            self.reaper = asyncio.get_running_loop().create_task(self._reap_idle())
+        return session
+
+    def close(self, user_id):
+        """End the user's session if there is one; returns whether one was open"""
+        session = self.sessions.pop(user_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    async def _reap_idle(self):
+        """Close sessions nobody has typed into for idle_timeout seconds"""
+        while self.sessions:
+            await asyncio.sleep(min(60, self.idle_timeout))
+            now = time.monotonic()
+            for user_id, session in list(self.sessions.items()):
+                if not session.alive:
+                    reason = 'shell exited'
+                elif now - session.last_active > self.idle_timeout:
+                    reason = 'idle timeout'
+                else:
+                    continue
+                logger.info(f"Closing shell session of user {user_id}: {reason}")
+                self.close(user_id)
+                await self.on_closed(session.chat_id, reason)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro Time Series
+Host metrics history in SQLite: each series is stored as blocks of
+fixed-width slots (min, max, sum, count) at four resolutions, all updated
+as samples arrive, so any range is read from a handful of blocks
+"""
+
+import math
+import time
+import struct
+from collections import defaultdict
+
+# (seconds per slot, slots per block, seconds kept or None for forever)
+TIERS = (
+    (10, 2160, 2 * 86400),        # Raw samples, 6 h per block
+    (60, 1440, 35 * 86400),       # 1 minute, 1 day per block
+    (3600, 720, 400 * 86400),     # 1 hour, 30 days per block
+    (86400, 366, None),           # 1 day, about a year per block
+)
+SLOT = struct.Struct('<ffdI')  # min, max, sum, count; an all-zero slot is empty
+MAX_NAME_LENGTH = 100
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS metric_series (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS metric_blocks (
+        id INTEGER PRIMARY KEY,
+        series_id INTEGER NOT NULL,
+        resolution INTEGER NOT NULL,
+        block_start INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        UNIQUE (series_id, resolution, block_start)
+    );
+'''
+
+
+def series_ids(db, names, create=False):
+    """Map series names to ids, creating missing series if asked"""
+    ids = {}
+    for name in names:
+        row = db.execute('SELECT id FROM metric_series WHERE name = ?', (name,)).fetchone()
+        if row is None and create:
+            row = (db.execute('INSERT INTO metric_series (name) VALUES (?)', (name,)).lastrowid,)
+        if row is not None:
+            ids[name] = row[0]
+    return ids
+
+
+def valid_sample(name, ts, value):
+    return (
+        isinstance(name, str) and 0 < len(name) <= MAX_NAME_LENGTH
+        and isinstance(ts, (int, float)) and isinstance(value, (int, float))
+        and math.isfinite(ts) and math.isfinite(value)
+    )
+
+
+def record(db, samples):
+    """Add (name, unix time, value) samples to every tier; call inside a write transaction
+
+    Samples are merged in memory first, so each touched block is read, updated
+    and written back once per call.
+    """
+    samples = [(name, int(ts), float(value)) for name, ts, value in samples if valid_sample(name, ts, value)]
+    if not samples:
+        return 0
+    ids = series_ids(db, {name for name, _, _ in samples}, create=True)
+
+    blocks = defaultdict(dict)  # (series_id, resolution, block_start) -> {slot index: [min, max, sum, count]}
+    for name, ts, value in samples:
+        for resolution, per_block, _ in TIERS:
+            span = resolution * per_block
+            block_start = ts // span * span
+            slots = blocks[(ids[name], resolution, block_start)]
+            index = (ts - block_start) // resolution
+            agg = slots.get(index)
+            if agg is None:
+                slots[index] = [value, value, value, 1]
+            else:
+                agg[0] = min(agg[0], value)
+                agg[1] = max(agg[1], value)
+                agg[2] += value
+                agg[3] += 1
+
+    per_block = {resolution: size for resolution, size, _ in TIERS}
+    for (series_id, resolution, block_start), slots in blocks.items():
+        row = db.execute('''
+            SELECT id, data FROM metric_blocks WHERE series_id = ? AND resolution = ? AND block_start = ?
+        ''', (series_id, resolution, block_start)).fetchone()
+        data = bytearray(row[1]) if row else bytearray(per_block[resolution] * SLOT.size)
+        for index, (low, high, total, count) in slots.items():
+            old_low, old_high, old_total, old_count = SLOT.unpack_from(data, index * SLOT.size)
+            if old_count:
+                low, high = min(low, old_low), max(high, old_high)
+                total, count = total + old_total, count + old_count
+            SLOT.pack_into(data, index * SLOT.size, low, high, total, count)
+        if row:
+            db.execute('UPDATE metric_blocks SET data = ? WHERE id = ?', (bytes(data), row[0]))
+        else:
+            db.execute('''
+                INSERT INTO metric_blocks (series_id, resolution, block_start, data) VALUES (?, ?, ?, ?)
+            ''', (series_id, resolution, block_start, bytes(data)))
+    return len(samples)
+
+
+def prune(db, now=None):
+    """Drop blocks that have aged out of their tier; returns how many were deleted"""
+    now = now or time.time()
+    deleted = 0
+    for resolution, per_block, keep in TIERS:
+        if keep is not None:
+            deleted += db.execute(
+                'DELETE FROM metric_blocks WHERE resolution = ? AND block_start + ? < ?',
+                (resolution, resolution * per_block, now - keep)
+            ).rowcount
+    return deleted
+
+
+def pick_tier(start, end, max_points, now=None):
+    """Finest tier that still covers start and returns at most max_points per series"""
+    now = now or time.time()
+    for resolution, per_block, keep in TIERS:
+        if (end - start) / resolution <= max_points and (keep is None or start >= now - keep):
+            return resolution, per_block
+    return TIERS[-1][:2]
+
+
+def query(db, names, start, end, max_points=1500):
+    """Points [time, avg, min, max] per series between start and end (unix seconds)"""
+    resolution, per_block = pick_tier(start, end, max_points)
+    span = resolution * per_block
+    result = {}
+    for name, series_id in series_ids(db, names).items():
+        points = []
+        for block_start, data in db.execute('''
+            SELECT block_start, data FROM metric_blocks
+            WHERE series_id = ? AND resolution = ? AND block_start > ? AND block_start <= ?
+            ORDER BY block_start
+        ''', (series_id, resolution, start - span, end)):
+            for index, (low, high, total, count) in enumerate(SLOT.iter_unpack(data)):
+                ts = block_start + index * resolution
+                if count and start <= ts <= end:
+                    points.append([ts, round(total / count, 3), round(low, 3), round(high, 3)])
+        result[name] = points
+    return resolution, result
+
+
+def list_series(db):
+    return [row[0] for row in db.execute('SELECT name FROM metric_series ORDER BY name')]
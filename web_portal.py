@@ -4,36 +4,189 @@ TeleCommand Pro Web Portal
 Web interface for managing the bot, users, and viewing command logs
 """
 
+import io
 import os
+import re
+import csv
+import gzip
 import json
+import zlib
+import hashlib
+import hmac
 import sqlite3
 import subprocess
 import signal
 import time
-from datetime import datetime
+import copy
+import queue
+import atexit
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
 from functools import wraps
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, session
 from werkzeug.security import generate_password_hash, check_password_hash
+from config_store import ConfigStore
+import audit_log
+import latency
+import timeseries
+import session_store
+import api_token
+
+try:
+    import brotli
+except ImportError:  # Optional: responses are gzipped only
+    brotli = None
+
+HAS_BLOBOPEN = hasattr(sqlite3.Connection, 'blobopen')  # Python 3.11+
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
 app.config['DATABASE'] = 'telecommand.db'
 app.config['BOT_PID_FILE'] = 'bot.pid'
 app.config['BOT_SCRIPT'] = 'bot.py'
+app.config['BOT_READY_FILE'] = 'bot.ready'  # Written by the bot once it is connected
+app.config['BOT_READY_TIMEOUT'] = 30  # Seconds to wait for it after starting the bot
+app.config['CACHE_TTL'] = 5  # Seconds a worker trusts its cached copy of a session and the user's role
+app.config['DB_TIMEOUT'] = 10  # Seconds to wait on a locked SQLite database
+app.config['LOG_BATCH_SIZE'] = 200  # Max command logs written per transaction
+app.config['LOG_QUEUE_SIZE'] = 10000  # Max command logs accepted but not yet written
+app.config['LOG_QUEUE_TIMEOUT'] = 5  # Seconds /api/log waits for room before answering 503
+app.config['LOG_CHECKPOINT_INTERVAL'] = 1000  # Command logs between signed audit checkpoints
+app.config['ACTIVITY_FLUSH_INTERVAL'] = 10  # Seconds Telegram user activity is collected before one batched write
+app.config['DASHBOARD_ACTIVE_USERS'] = 10  # Most recently seen users listed on the dashboard
+app.config['AUDIT_KEY_FILE'] = 'audit.key'  # Checkpoint signing key, unless $TELECOMMAND_AUDIT_KEY is set
+app.config['SECRET_KEY_FILE'] = 'secret.key'  # Session signing key, unless $TELECOMMAND_SECRET_KEY is set
+app.config['API_TOKEN_FILE'] = 'api.key'  # Token the bot sends to the /api endpoints, unless $TELECOMMAND_API_TOKEN is set
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)  # Logins expire after this long without a visit
+app.config['COMPRESS_MIN_SIZE'] = 500  # Smaller HTML/JSON responses are sent uncompressed
+app.config['OUTPUT_INLINE_BYTES'] = 64 * 1024  # Larger log outputs are paged in by the viewer
+app.config['OUTPUT_CHUNK_BYTES'] = 64 * 1024  # Bytes per viewer request
+app.config['OUTPUT_MAX_CHUNK_BYTES'] = 1024 * 1024
+app.config['OUTPUT_SEARCH_WINDOW'] = 1024 * 1024  # Bytes of output scanned per read when searching
+app.config['METRICS_PRUNE_INTERVAL'] = 3600  # Seconds between deletions of expired metric blocks
+
+
+config_store = ConfigStore('config.json', defaults={
+    'telegram_token': '',
+    'authorized_users': [],
+    'whitelist_enabled': False,
+    'allowed_commands': [],
+    'command_timeout': 30
+})
+
+
+# Static assets and HTTP caching
+ASSET_DIR = os.path.join(app.root_path, 'static')
+COMPRESSIBLE_TYPES = {'text/html', 'application/json', 'text/css', 'application/javascript', 'text/javascript'}
+_assets = {}  # Hashed name -> (mimetype, etag, {encoding: body})
+_asset_names = {}  # Source name -> hashed name
+
+
+def load_assets():
+    """Fingerprint and precompress everything in static/ (portal.css -> portal.<hash>.css)"""
+    for name in sorted(os.listdir(ASSET_DIR)):
+        with open(os.path.join(ASSET_DIR, name), 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        hashed = f'{stem}.{digest}{ext}'
+        mimetype = 'text/css' if ext == '.css' else 'application/javascript' if ext == '.js' else 'application/octet-stream'
+        bodies = {None: data, 'gzip': gzip.compress(data, 9)}
+        if brotli:
+            bodies['br'] = brotli.compress(data, quality=11)
+        _assets[hashed] = (mimetype, digest, bodies)
+        _asset_names[name] = hashed
+
+
+def asset_url(name):
+    """URL of a static asset under its content-hashed name (for templates)"""
+    return url_for('asset', name=_asset_names[name])
+
+
+load_assets()
+app.jinja_env.globals['asset_url'] = asset_url
+
+
+def pick_encoding(available=('br', 'gzip')):
+    """Best content coding the client accepts among the available ones, or None"""
+    for encoding in available:
+        if encoding == 'br' and not brotli:
+            continue
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)  # Fast setting for per-request compression
+    return gzip.compress(data, 6)
+
+
+@app.route('/assets/<name>')
+def asset(name):
+    """Serve a fingerprinted asset; its URL changes with its content, so it can be cached forever"""
+    if name not in _assets:
+        return 'Not found', 404
+    mimetype, digest, bodies = _assets[name]
+    
+    response = Response(mimetype=mimetype)
+    response.set_etag(digest)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.vary.add('Accept-Encoding')
+    if request.if_none_match.contains(digest):
+        response.status_code = 304
+        return response
+    encoding = pick_encoding([e for e in bodies if e])
+    response.set_data(bodies[encoding])
+    if encoding:
+        response.content_encoding = encoding
+    return response
+
+
+@app.after_request
+def cache_and_compress(response):
+    """ETag / 304 revalidation for pages and JSON, then on-the-fly compression"""
+    if (response.direct_passthrough or response.is_streamed or response.content_encoding
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    
+    if request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.get_etag()[0]:
+        # Weak: the same page compressed or not is still the same page
+        response.add_etag(weak=True)
+        response.headers.setdefault('Cache-Control', 'private, no-cache')
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+    
+    response.vary.add('Accept-Encoding')
+    if response.content_length and response.content_length >= app.config['COMPRESS_MIN_SIZE']:
+        encoding = pick_encoding()
+        if encoding:
+            response.set_data(compress(response.get_data(), encoding))
+            response.content_encoding = encoding
+    return response
 
 
 # Database functions
 def get_db():
     """Get database connection"""
-    db = sqlite3.connect(app.config['DATABASE'])
+    db = sqlite3.connect(app.config['DATABASE'], timeout=app.config['DB_TIMEOUT'])
     db.row_factory = sqlite3.Row
     return db
 
 
+# Sessions live in the database, so every worker process shares them
+app.session_interface = session_store.SQLiteSessionInterface(get_db, cache_ttl=app.config['CACHE_TTL'])
+
+
 def init_db():
     """Initialize database with tables"""
     db = get_db()
     
+    # WAL lets readers (page views) run while the log writer commits
+    db.execute('PRAGMA journal_mode=WAL')
+    
     # Create tables with current schema
     db.executescript('''
         CREATE TABLE IF NOT EXISTS portal_users (
@@ -54,7 +207,9 @@ def init_db():
             last_name TEXT,
             is_active INTEGER DEFAULT 1,
             added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_seen TIMESTAMP
+            last_seen TIMESTAMP,
+            command_count INTEGER DEFAULT 0,
+            denied_count INTEGER DEFAULT 0
         );
         
         CREATE TABLE IF NOT EXISTS command_logs (
@@ -64,14 +219,53 @@ def init_db():
             output TEXT,
             success INTEGER,
             executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            chain_hash TEXT,
+            duration_seconds REAL,
+            exit_code INTEGER,
+            stdout_bytes INTEGER,
+            stderr_bytes INTEGER,
+            timed_out INTEGER,
             FOREIGN KEY (telegram_user_id) REFERENCES telegram_users (user_id)
         );
         
+        CREATE TABLE IF NOT EXISTS log_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            last_log_id INTEGER NOT NULL,
+            chain_hash TEXT NOT NULL,
+            signature TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
         CREATE TABLE IF NOT EXISTS bot_config (
             key TEXT PRIMARY KEY,
             value TEXT NOT NULL,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
+        
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_user_id INTEGER NOT NULL,
+            command TEXT NOT NULL,
+            kind TEXT NOT NULL DEFAULT 'every',
+            interval_seconds INTEGER,
+            at_time TEXT,
+            match TEXT,
+            notify TEXT DEFAULT 'change',
+            is_active INTEGER DEFAULT 1,
+            last_run REAL,
+            last_hash TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE TABLE IF NOT EXISTS bot_starts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action TEXT NOT NULL,
+            ready_seconds REAL,
+            startup_seconds REAL,
+            import_seconds REAL,
+            connect_seconds REAL,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
     ''')
     
     # Create default admin user if not exists
@@ -99,6 +293,55 @@ def init_db():
         except sqlite3.OperationalError:
             pass
     
+    # Migration: execution metrics on command logs
+    for column, kind in (('duration_seconds', 'REAL'), ('exit_code', 'INTEGER'), ('stdout_bytes', 'INTEGER'),
+                         ('stderr_bytes', 'INTEGER'), ('timed_out', 'INTEGER')):
+        try:
+            db.execute(f'SELECT {column} FROM command_logs LIMIT 1')
+        except sqlite3.OperationalError:
+            db.execute(f'ALTER TABLE command_logs ADD COLUMN {column} {kind}')
+    
+    # Latency histograms for the analytics page, kept up to date by the log writer
+    db.executescript(latency.SCHEMA)
+    
+    # Host metrics history
+    db.executescript(timeseries.SCHEMA)
+    
+    # Server-side login sessions
+    db.executescript(session_store.SCHEMA)
+    
+    # Migration: activity counters on Telegram users
+    for column in ('command_count', 'denied_count'):
+        try:
+            db.execute(f'SELECT {column} FROM telegram_users LIMIT 1')
+        except sqlite3.OperationalError:
+            db.execute(f'ALTER TABLE telegram_users ADD COLUMN {column} INTEGER DEFAULT 0')
+    
+    # Most recently seen users first, for the dashboard
+    db.execute('CREATE INDEX IF NOT EXISTS idx_telegram_users_last_seen ON telegram_users (is_active, last_seen)')
+    
+    # Time-ordered scans for the logs page and exports, optionally per user
+    db.execute('CREATE INDEX IF NOT EXISTS idx_command_logs_executed_at ON command_logs (executed_at)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_command_logs_user ON command_logs (telegram_user_id, executed_at)')
+    
+    # Migration: chain existing command logs, then make the table append-only
+    try:
+        db.execute('SELECT chain_hash FROM command_logs LIMIT 1')
+    except sqlite3.OperationalError:
+        db.execute('ALTER TABLE command_logs ADD COLUMN chain_hash TEXT')
+    if db.execute('SELECT 1 FROM command_logs WHERE chain_hash IS NULL LIMIT 1').fetchone():
+        # The append-only trigger would block filling in the hashes
+        db.execute('DROP TRIGGER IF EXISTS command_logs_no_update')
+        chained = audit_log.backfill(db)
+        app.logger.info(f'Added {chained} existing command logs to the audit hash chain')
+    db.executescript('''
+        CREATE TRIGGER IF NOT EXISTS command_logs_no_update BEFORE UPDATE ON command_logs
+        BEGIN SELECT RAISE(ABORT, 'command_logs is append-only'); END;
+        
+        CREATE TRIGGER IF NOT EXISTS command_logs_no_delete BEFORE DELETE ON command_logs
+        BEGIN SELECT RAISE(ABORT, 'command_logs is append-only'); END;
+    ''')
+    
     # Ensure admin user has admin role
     db.execute('''UPDATE portal_users SET role = ? 
                   WHERE username = ? AND (role IS NULL OR role = \'\' OR role = \'viewer\')''',
@@ -106,6 +349,209 @@ def init_db():
     
     db.commit()
     db.close()
+    
+    # A persisted key keeps sessions valid across restarts and between worker processes
+    if not app.secret_key:
+        app.secret_key = session_store.load_secret_key(app.config['SECRET_KEY_FILE'])
+    get_api_token()  # Create api.key before the bot starts and looks for it
+
+
+# Background log ingest
+class BackgroundWorker:
+    """Base for the writers below: `_run` loops on a daemon thread of the object's own"""
+    
+    thread_name = 'background-worker'
+    
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def _ensure_started(self):
+        # Started lazily so each worker process gets its own thread after fork
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                    self._thread.start()
+    
+    def _run(self):
+        raise NotImplementedError
+
+
+class LogWriter(BackgroundWorker):
+    """Batches command log inserts on a worker thread so /api/log never waits on SQLite
+    
+    At most `maxsize` entries wait in memory; submit() blocks for up to
+    `timeout` seconds for room and then raises queue.Full.
+    """
+    
+    thread_name = 'log-writer'
+    
+    def __init__(self, batch_size=200, maxsize=10000, timeout=5):
+        super().__init__()
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=maxsize)
+    
+    def submit(self, entry):
+        """Queue a log entry for writing"""
+        self._ensure_started()
+        self._queue.put(entry, timeout=self.timeout)
+    
+    def flush(self):
+        """Block until every queued entry has been written"""
+        self._queue.join()
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                app.logger.error(f'Failed to write {len(batch)} command logs: {e}')
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _write(self, batch):
+        db = get_db()
+        try:
+            # Take the write lock first so no other worker process moves the chain's tail
+            db.execute('BEGIN IMMEDIATE')
+            rows = audit_log.append(db, batch, get_audit_key(), app.config['LOG_CHECKPOINT_INTERVAL'])
+            latency.record(db, rows)
+            db.commit()
+        finally:
+            db.close()
+        
+        for row in rows:
+            if row['telegram_user_id'] is not None:
+                activity.touch(row['telegram_user_id'], commands=1)
+
+
+class ActivityTracker(BackgroundWorker):
+    """Collects last-seen times and counters of Telegram users in memory and upserts them in one batch
+    
+    Every worker process keeps its own counts; the upsert adds them to the
+    stored ones, so workers flushing into the same rows don't overwrite each
+    other. Users seen for the first time are registered, as active if they
+    ran commands or are listed in config.json's authorized_users.
+    """
+    
+    UPSERT = '''
+        INSERT INTO telegram_users (user_id, username, first_name, last_name, is_active, last_seen, command_count, denied_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            username = COALESCE(excluded.username, username),
+            first_name = COALESCE(excluded.first_name, first_name),
+            last_name = COALESCE(excluded.last_name, last_name),
+            last_seen = MAX(COALESCE(last_seen, ''), excluded.last_seen),
+            command_count = COALESCE(command_count, 0) + excluded.command_count,
+            denied_count = COALESCE(denied_count, 0) + excluded.denied_count
+    '''
+    
+    thread_name = 'activity-flush'
+    
+    def __init__(self, interval=10):
+        super().__init__()
+        self.interval = interval
+        self._pending = {}  # user_id -> [username, first_name, last_name, last_seen, commands, denied]
+    
+    def touch(self, user_id, username=None, first_name=None, last_name=None, commands=0, denied=0, seen=None):
+        """Record that a user was seen now (or at `seen`, formatted like CURRENT_TIMESTAMP)"""
+        seen = seen or datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            pending = self._pending.setdefault(user_id, [None, None, None, seen, 0, 0])
+            for i, value in enumerate((username, first_name, last_name)):
+                if value:
+                    pending[i] = value
+            pending[3] = max(pending[3], seen)
+            pending[4] += commands
+            pending[5] += denied
+        self._ensure_started()
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+    
+    def flush(self):
+        """Write everything collected so far; returns the number of users written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            authorized = set(load_bot_config().get('authorized_users', []))
+            db = get_db()
+            try:
+                db.executemany(self.UPSERT, [
+                    (user_id, username, first_name, last_name, int(bool(commands) or user_id in authorized),
+                     seen, commands, denied)
+                    for user_id, (username, first_name, last_name, seen, commands, denied) in pending.items()
+                ])
+                db.commit()
+            finally:
+                db.close()
+        except (sqlite3.Error, OSError, ValueError) as e:
+            app.logger.error(f'Failed to write activity of {len(pending)} Telegram users: {e}')
+            # Keep it for the next flush
+            for user_id, (username, first_name, last_name, seen, commands, denied) in pending.items():
+                self.touch(user_id, username, first_name, last_name, commands, denied, seen)
+            return 0
+        return len(pending)
+
+
+log_writer = LogWriter(
+    batch_size=app.config['LOG_BATCH_SIZE'],
+    maxsize=app.config['LOG_QUEUE_SIZE'],
+    timeout=app.config['LOG_QUEUE_TIMEOUT']
+)
+activity = ActivityTracker(interval=app.config['ACTIVITY_FLUSH_INTERVAL'])
+# Accepted entries only live in memory until written; write them before exiting
+atexit.register(activity.flush)
+atexit.register(log_writer.flush)  # Runs first: its writes feed the activity counts
+_audit_key = None
+
+
+def get_audit_key():
+    """Key used to sign audit checkpoints, loaded (or created) on first use"""
+    global _audit_key
+    if _audit_key is None:
+        _audit_key = audit_log.load_key(app.config['AUDIT_KEY_FILE'])
+    return _audit_key
+
+
+_api_token = None
+
+
+def get_api_token():
+    """Token the bot authenticates with, loaded (or created) on first use"""
+    global _api_token
+    if _api_token is None:
+        _api_token = api_token.load(app.config['API_TOKEN_FILE'])
+    return _api_token
+
+
+# Template filters
+@app.template_filter('timestamp')
+def format_timestamp(value):
+    """Format a Unix timestamp for display"""
+    return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+
+
+@app.template_filter('interval')
+def format_interval(seconds):
+    """Format seconds as a short interval string"""
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
 
 
 # Authentication decorators
@@ -126,11 +572,8 @@ def admin_required(f):
             flash('Please login first', 'error')
             return redirect(url_for('login'))
         
-        db = get_db()
-        user = db.execute('SELECT role FROM portal_users WHERE id = ?', (session['user_id'],)).fetchone()
-        db.close()
-        
-        if not user or user['role'] != 'admin':
+        # The session store reloads the role on every request, so this is current
+        if session.get('role') != 'admin':
             flash('Admin access required', 'error')
             return redirect(url_for('index'))
         
@@ -138,26 +581,39 @@ def admin_required(f):
     return decorated_function
 
 
+def bot_api_required(f):
+    """For the endpoints the bot calls: require the shared API token instead of a login"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = request.headers.get(api_token.HEADER, '')
+        if not hmac.compare_digest(token.encode(), get_api_token().encode()):
+            return jsonify({'status': 'error', 'message': 'Invalid API token'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
 # Config management
+_bot_config = None  # (file stamp, config) of the last load
+
+
 def load_bot_config():
-    """Load bot configuration from config.json"""
-    try:
-        with open('config.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {
-            'telegram_token': '',
-            'authorized_users': [],
-            'whitelist_enabled': False,
-            'allowed_commands': [],
-            'command_timeout': 30
-        }
+    """Load bot configuration from config.json (cached until the file changes)"""
+    global _bot_config
+    stamp = config_store.stamp()
+    cached = _bot_config
+    if cached is None or cached[0] != stamp:
+        # Reload when the file changed on disk, e.g. edited by hand
+        cached = _bot_config = (stamp, config_store.load())
+    # Callers modify the result before saving, so hand out a private copy
+    return copy.deepcopy(cached[1])
 
 
-def save_bot_config(config):
-    """Save bot configuration to config.json"""
-    with open('config.json', 'w') as f:
-        json.dump(config, f, indent=2)
+def update_bot_config(mutate):
+    """Load, modify and save config.json under the config lock"""
+    global _bot_config
+    config = config_store.update(mutate)
+    _bot_config = None
+    return config
 
 
 # Bot process management
@@ -184,6 +640,14 @@ def is_bot_running():
     if not pid:
         return False
     try:
+        # A bot started by this process stays a zombie (and answers signal 0) until reaped
+        if hasattr(os, 'WNOHANG'):
+            try:
+                if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                    raise ProcessLookupError(pid)
+            except ChildProcessError:
+                pass  # Not our child
+
         # Send signal 0 to check if process exists
         os.kill(pid, 0)
         return True
@@ -194,24 +658,88 @@ def is_bot_running():
         return False
 
 
-def start_bot():
-    """Start the bot process"""
+def read_bot_ready(pid):
+    """The bot's readiness report if process pid has written one, else None"""
+    try:
+        with open(app.config['BOT_READY_FILE']) as f:
+            ready = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return ready if ready.get('pid') == pid else None
+
+
+def record_bot_start(action, ready_seconds, ready):
+    """Store how long a start/restart took until the bot was connected"""
+    ready = ready or {}
+    db = get_db()
+    db.execute('''
+        INSERT INTO bot_starts (action, ready_seconds, startup_seconds, import_seconds, connect_seconds)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (action, ready_seconds, ready.get('startup_seconds'), ready.get('import_seconds'),
+          ready.get('connect_seconds')))
+    db.commit()
+    db.close()
+
+
+def get_start_metrics(limit=10):
+    """Latest start and the average ready time over the last `limit` successful ones"""
+    db = get_db()
+    last = db.execute('SELECT * FROM bot_starts ORDER BY id DESC LIMIT 1').fetchone()
+    average = db.execute('''
+        SELECT AVG(ready_seconds) FROM (
+            SELECT ready_seconds FROM bot_starts WHERE ready_seconds IS NOT NULL ORDER BY id DESC LIMIT ?
+        )
+    ''', (limit,)).fetchone()[0]
+    db.close()
+    return {'last': dict(last) if last else None, 'average_ready_seconds': average}
+
+
+def wait_for(predicate, timeout, interval=0.1):
+    """Poll predicate until it returns True or timeout seconds pass"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
+
+
+def start_bot(action='start', requested_at=None):
+    """Start the bot process and wait until it reports being connected
+    
+    requested_at (a time.monotonic() value) is when the start or restart was
+    asked for; the time from then until the bot is ready goes into bot_starts.
+    """
+    requested_at = requested_at or time.monotonic()
     if is_bot_running():
         return {'success': False, 'message': 'Bot is already running'}
     
     try:
-        # Start bot process
+        if os.path.exists(app.config['BOT_READY_FILE']):
+            os.remove(app.config['BOT_READY_FILE'])
+        
+        # Start bot process; it logs to bot.log, and pipes nobody reads would eventually block it
         process = subprocess.Popen(
             ['python3', app.config['BOT_SCRIPT']],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
             start_new_session=True
         )
         save_bot_pid(process.pid)
-        time.sleep(2)  # Give it time to start
         
-        if is_bot_running():
-            return {'success': True, 'message': f'Bot started successfully (PID: {process.pid})'}
+        # Wait for the readiness signal, returning early if it crashes
+        wait_for(lambda: process.poll() is not None or read_bot_ready(process.pid),
+                 app.config['BOT_READY_TIMEOUT'], interval=0.05)
+        
+        ready = read_bot_ready(process.pid)
+        if ready:
+            ready_seconds = round(time.monotonic() - requested_at, 3)
+            record_bot_start(action, ready_seconds, ready)
+            return {'success': True, 'ready_seconds': ready_seconds,
+                    'message': f'Bot ready in {ready_seconds:.1f}s (PID: {process.pid})'}
+        elif is_bot_running():
+            record_bot_start(action, None, None)
+            return {'success': True, 'message': f'Bot started (PID: {process.pid}) but has not connected to Telegram yet'}
         else:
             return {'success': False, 'message': 'Bot failed to start'}
     except Exception as e:
@@ -227,31 +755,44 @@ def stop_bot():
     try:
         # Send SIGTERM to gracefully stop the bot
         os.kill(pid, signal.SIGTERM)
-        time.sleep(2)  # Wait for graceful shutdown
+        wait_for(lambda: not is_bot_running(), 2)  # Wait for graceful shutdown
         
         # Check if still running
         if is_bot_running():
             # Force kill if still running
             os.kill(pid, signal.SIGKILL)
-            time.sleep(1)
+            wait_for(lambda: not is_bot_running(), 1)
         
-        # Clean up PID file
-        if os.path.exists(app.config['BOT_PID_FILE']):
-            os.remove(app.config['BOT_PID_FILE'])
+        # Clean up PID and ready files (a killed bot can't remove them itself)
+        for path in (app.config['BOT_PID_FILE'], app.config['BOT_READY_FILE']):
+            if os.path.exists(path):
+                os.remove(path)
         
         return {'success': True, 'message': 'Bot stopped successfully'}
     except Exception as e:
         return {'success': False, 'message': f'Error stopping bot: {str(e)}'}
 
 
+def get_bot_status():
+    """Running state, readiness and start-up timing of the bot"""
+    pid = get_bot_pid()
+    running = is_bot_running()
+    return {
+        'running': running,
+        'pid': pid,
+        'ready': running and read_bot_ready(pid) is not None,
+        **get_start_metrics()
+    }
+
+
 def restart_bot():
     """Restart the bot process"""
+    requested_at = time.monotonic()
     stop_result = stop_bot()
     if not stop_result['success'] and 'not running' not in stop_result['message']:
         return stop_result
     
-    time.sleep(1)
-    return start_bot()
+    return start_bot('restart', requested_at)
 
 
 # Routes
@@ -262,10 +803,7 @@ def index():
     db = get_db()
     
     # Get bot status
-    bot_status = {
-        'running': is_bot_running(),
-        'pid': get_bot_pid()
-    }
+    bot_status = get_bot_status()
     
     # Get statistics
     stats = {
@@ -289,7 +827,8 @@ def index():
         SELECT * FROM telegram_users 
         WHERE is_active = 1 
         ORDER BY last_seen DESC
-    ''').fetchall()
+        LIMIT ?
+    ''', (app.config['DASHBOARD_ACTIVE_USERS'],)).fetchall()
     
     db.close()
     
@@ -391,6 +930,8 @@ def toggle_portal_user(user_id):
     if user:
         new_status = 0 if user['is_active'] else 1
         db.execute('UPDATE portal_users SET is_active = ? WHERE id = ?', (new_status, user_id))
+        if not new_status:
+            app.session_interface.revoke(db, user_id)
         db.commit()
         status_text = 'enabled' if new_status else 'disabled'
         flash(f'User {user["username"]} {status_text} successfully', 'success')
@@ -415,6 +956,7 @@ def delete_portal_user(user_id):
     
     if user:
         db.execute('DELETE FROM portal_users WHERE id = ?', (user_id,))
+        app.session_interface.revoke(db, user_id)
         db.commit()
         flash(f'User {user["username"]} deleted successfully', 'success')
     else:
@@ -465,6 +1007,8 @@ def change_password():
     
     db.execute('UPDATE portal_users SET password_hash = ? WHERE id = ?',
                (generate_password_hash(new_password), session['user_id']))
+    # Log out every other browser signed in with the old password
+    app.session_interface.revoke(db, session['user_id'], keep=session.sid)
     db.commit()
     db.close()
     
@@ -502,18 +1046,24 @@ def add_user():
         
         # Add to database
         db = get_db()
+        # Users the bot has already seen keep their activity; blank fields keep the seen names
         db.execute('''
-            INSERT OR REPLACE INTO telegram_users (user_id, username, first_name, is_active)
+            INSERT INTO telegram_users (user_id, username, first_name, is_active)
             VALUES (?, ?, ?, 1)
+            ON CONFLICT (user_id) DO UPDATE SET
+                username = COALESCE(NULLIF(excluded.username, ''), username),
+                first_name = COALESCE(NULLIF(excluded.first_name, ''), first_name),
+                is_active = 1
         ''', (user_id, username, first_name))
         db.commit()
         db.close()
         
         # Update config.json
-        config = load_bot_config()
-        if user_id not in config['authorized_users']:
-            config['authorized_users'].append(user_id)
-            save_bot_config(config)
+        def add_authorized(config):
+            authorized = config.setdefault('authorized_users', [])
+            if user_id not in authorized:
+                authorized.append(user_id)
+        update_bot_config(add_authorized)
         
         flash(f'User {user_id} added successfully', 'success')
     except ValueError:
@@ -535,10 +1085,11 @@ def remove_user(user_id):
     db.close()
     
     # Update config.json
-    config = load_bot_config()
-    if user_id in config['authorized_users']:
-        config['authorized_users'].remove(user_id)
-        save_bot_config(config)
+    def remove_authorized(config):
+        authorized = config.setdefault('authorized_users', [])
+        if user_id in authorized:
+            authorized.remove(user_id)
+    update_bot_config(remove_authorized)
     
     flash(f'User {user_id} removed successfully', 'success')
     return redirect(url_for('users'))
@@ -572,24 +1123,289 @@ def logs():
     return render_template('logs.html', logs=command_logs, page=page, total_pages=total_pages)
 
 
+# Log export
+EXPORT_FIELDS = ('id', 'executed_at', 'telegram_user_id', 'username', 'first_name', 'command', 'success',
+                 'exit_code', 'duration_seconds', 'timed_out', 'stdout_bytes', 'stderr_bytes', 'output')
+EXPORT_CHUNK_SIZE = 64 * 1024  # Bytes of text collected before each write to the client
+
+
+def parse_export_time(value, end=False):
+    """Parse YYYY-MM-DD[ HH:MM[:SS]] into the executed_at format; a bare end date covers that whole day"""
+    parsed = datetime.fromisoformat(value.strip())
+    if end and len(value.strip()) == 10:
+        parsed += timedelta(days=1)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def iter_export_rows(since, until, user_id):
+    """Yield matching logs oldest first straight from the cursor, one row at a time"""
+    clauses, params = [], []
+    if since:
+        clauses.append('cl.executed_at >= ?')
+        params.append(since)
+    if until:
+        clauses.append('cl.executed_at < ?')
+        params.append(until)
+    if user_id is not None:
+        clauses.append('cl.telegram_user_id = ?')
+        params.append(user_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    
+    db = get_db()
+    try:
+        # Ordered like the executed_at indexes, so SQLite never has to sort the result
+        yield from db.execute(f'''
+            SELECT cl.id, cl.executed_at, cl.telegram_user_id, tu.username, tu.first_name,
+                   cl.command, cl.success, cl.exit_code, cl.duration_seconds, cl.timed_out,
+                   cl.stdout_bytes, cl.stderr_bytes, cl.output
+            FROM command_logs cl
+            LEFT JOIN telegram_users tu ON cl.telegram_user_id = tu.user_id
+            {where}
+            ORDER BY cl.executed_at, cl.id
+        ''', params)
+    finally:
+        db.close()
+
+
+def encode_export(rows, fmt):
+    """Render rows as CSV or JSON lines in chunks of about EXPORT_CHUNK_SIZE
+    
+    The CSV header and the first row go out on their own, so the client gets
+    data as soon as the query finds any, even when a narrow filter makes it
+    scan a long way between matches.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(EXPORT_FIELDS)
+        yield buffer.getvalue()  # Send the header right away
+        buffer.seek(0)
+        buffer.truncate()
+    first = True
+    for row in rows:
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n')
+        if first or buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            first = False
+    yield buffer.getvalue()
+
+
+def gzip_stream(chunks):
+    """Gzip a stream of text chunks incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if len(chunk) < EXPORT_CHUNK_SIZE:
+            # A short chunk (header, first row) is meant to go out now, not wait for a full deflate block
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.route('/api/logs/export')
+@login_required
+def api_logs_export():
+    """Stream command logs as CSV or JSONL (?format=, since=, until=, user_id=, gzip=1)"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'status': 'error', 'message': 'format must be csv or jsonl'}), 400
+    try:
+        since = parse_export_time(request.args['since']) if request.args.get('since') else None
+        until = parse_export_time(request.args['until'], end=True) if request.args.get('until') else None
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'since/until must look like YYYY-MM-DD or YYYY-MM-DD HH:MM'}), 400
+    user_id = request.args.get('user_id', type=int)
+    gzip_requested = request.args.get('gzip') in ('1', 'true', 'on')
+    
+    body = encode_export(iter_export_rows(since, until, user_id), fmt)
+    filename = f"command_logs-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    headers = {'X-Accel-Buffering': 'no'}  # Don't let a reverse proxy hold the stream back
+    if gzip_requested:
+        body = gzip_stream(body)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return Response(body, mimetype=mimetype, headers=headers)
+
+
 @app.route('/logs/<int:log_id>')
 @login_required
 def log_detail(log_id):
-    """View detailed log"""
+    """View detailed log; large outputs are paged in by the viewer instead of rendered"""
     db = get_db()
     log = db.execute('''
-        SELECT cl.*, tu.username, tu.first_name, tu.last_name
+        SELECT cl.id, cl.telegram_user_id, cl.command, cl.success, cl.executed_at, cl.duration_seconds,
+               cl.exit_code, cl.stdout_bytes, cl.stderr_bytes, cl.timed_out,
+               tu.username, tu.first_name, tu.last_name
         FROM command_logs cl
         LEFT JOIN telegram_users tu ON cl.telegram_user_id = tu.user_id
         WHERE cl.id = ?
     ''', (log_id,)).fetchone()
+    
+    output, output_size = None, 0
+    if log:
+        blob = open_output(db, log_id)
+        if blob:
+            with blob:
+                output_size = len(blob)
+                if output_size <= app.config['OUTPUT_INLINE_BYTES']:
+                    output = blob.read().decode('utf-8', 'replace')
     db.close()
     
     if not log:
         flash('Log not found', 'error')
         return redirect(url_for('logs'))
     
-    return render_template('log_detail.html', log=log)
+    return render_template('log_detail.html', log=log, output=output, output_size=output_size,
+                           chunk_size=app.config['OUTPUT_CHUNK_BYTES'])
+
+
+# Log output viewer
+class OutputReader:
+    """File-like byte reads of a log's output with substr(), for Pythons before 3.11 (no blobopen)"""
+    
+    def __init__(self, db, log_id, size):
+        self.db = db
+        self.log_id = log_id
+        self.size = size
+        self.pos = 0
+    
+    def __len__(self):
+        return self.size
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def seek(self, pos):
+        self.pos = pos
+    
+    def read(self, length=-1):
+        if length < 0:
+            length = self.size - self.pos
+        # As a BLOB, substr() counts bytes rather than characters
+        data = self.db.execute(
+            'SELECT substr(CAST(output AS BLOB), ?, ?) FROM command_logs WHERE id = ?',
+            (self.pos + 1, length, self.log_id)
+        ).fetchone()[0]
+        self.pos += len(data)
+        return bytes(data)
+
+
+def open_output(db, log_id):
+    """Incremental reader over a log's output, or None if it has none"""
+    if HAS_BLOBOPEN:
+        try:
+            return db.blobopen('command_logs', 'output', log_id, readonly=True)
+        except sqlite3.OperationalError:  # NULL output (or no such log)
+            return None
+    row = db.execute('SELECT length(CAST(output AS BLOB)) FROM command_logs WHERE id = ?', (log_id,)).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return OutputReader(db, log_id, row[0])
+
+
+def read_output(blob, offset, length):
+    """Read about length bytes at offset, moved to UTF-8 character boundaries"""
+    size = len(blob)
+    offset = max(0, min(offset, size))
+    blob.seek(offset)
+    data = blob.read(length + 3)
+    
+    # Continuation bytes (10xxxxxx) belong to the character before: skip them
+    # at the start, and take them along at the end to finish the last character
+    start = 0
+    while offset and start < min(3, len(data)) and data[start] & 0xC0 == 0x80:
+        start += 1
+    end = min(length, len(data))
+    while end < len(data) and data[end] & 0xC0 == 0x80:
+        end += 1
+    return {
+        'offset': offset + start,
+        'next_offset': offset + end,
+        'size': size,
+        'text': data[start:end].decode('utf-8', 'replace'),
+    }
+
+
+def search_output(blob, needle, start, limit):
+    """Byte offsets of matches of needle (ASCII case-insensitive), scanning a window at a time"""
+    size = len(blob)
+    window = app.config['OUTPUT_SEARCH_WINDOW']
+    matches = []
+    pos = max(0, start)
+    while pos < size and len(matches) < limit:
+        blob.seek(pos)
+        # Overlap windows so matches across a window edge are found
+        data = blob.read(window + len(needle) - 1).lower()
+        i = data.find(needle)
+        while i != -1 and i < window and len(matches) < limit:
+            matches.append(pos + i)
+            i = data.find(needle, i + 1)
+        pos += window
+    more = len(matches) == limit
+    return matches, (matches[-1] + 1 if more else None)
+
+
+@app.route('/api/logs/<int:log_id>/output')
+@login_required
+def api_log_output(log_id):
+    """One window of a log's output (?offset=<byte>&length=<bytes>)"""
+    offset = max(0, request.args.get('offset', 0, type=int))
+    length = request.args.get('length', app.config['OUTPUT_CHUNK_BYTES'], type=int)
+    length = max(1, min(length, app.config['OUTPUT_MAX_CHUNK_BYTES']))
+    
+    db = get_db()
+    try:
+        if not db.execute('SELECT 1 FROM command_logs WHERE id = ?', (log_id,)).fetchone():
+            return jsonify({'status': 'error', 'message': 'Log not found'}), 404
+        blob = open_output(db, log_id)
+        if blob is None:
+            return jsonify({'offset': 0, 'next_offset': 0, 'size': 0, 'text': ''})
+        with blob:
+            window = read_output(blob, offset, length)
+    finally:
+        db.close()
+    
+    response = jsonify(window)
+    # Logs are append-only, so a window never changes
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+@app.route('/api/logs/<int:log_id>/output/search')
+@login_required
+def api_log_output_search(log_id):
+    """Find text in a log's output (?q=&start=<byte>&limit=); returns byte offsets of matches"""
+    query = request.args.get('q', '')
+    if not query:
+        return jsonify({'status': 'error', 'message': 'q is required'}), 400
+    start = request.args.get('start', 0, type=int)
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    
+    db = get_db()
+    try:
+        if not db.execute('SELECT 1 FROM command_logs WHERE id = ?', (log_id,)).fetchone():
+            return jsonify({'status': 'error', 'message': 'Log not found'}), 404
+        blob = open_output(db, log_id)
+        if blob is None:
+            return jsonify({'matches': [], 'next_start': None, 'size': 0})
+        with blob:
+            matches, next_start = search_output(blob, query.encode('utf-8').lower(), start, limit)
+            size = len(blob)
+    finally:
+        db.close()
+    return jsonify({'matches': matches, 'next_start': next_start, 'size': size})
 
 
 @app.route('/config', methods=['GET', 'POST'])
@@ -602,20 +1418,21 @@ def config():
             flash('Admin access required to modify configuration', 'error')
             return redirect(url_for('config'))
         
-        config = load_bot_config()
+        form = request.form
         
-        config['telegram_token'] = request.form.get('telegram_token', config.get('telegram_token', ''))
-        config['whitelist_enabled'] = request.form.get('whitelist_enabled') == 'on'
-        config['command_timeout'] = int(request.form.get('command_timeout', 30))
-        
-        # Parse allowed commands
-        allowed_commands = request.form.get('allowed_commands', '').strip()
-        if allowed_commands:
-            config['allowed_commands'] = [cmd.strip() for cmd in allowed_commands.split('\n') if cmd.strip()]
-        else:
-            config['allowed_commands'] = []
+        def apply_form(config):
+            config['telegram_token'] = form.get('telegram_token', config.get('telegram_token', ''))
+            config['whitelist_enabled'] = form.get('whitelist_enabled') == 'on'
+            config['command_timeout'] = int(form.get('command_timeout', 30))
+            
+            # Parse allowed commands
+            allowed_commands = form.get('allowed_commands', '').strip()
+            if allowed_commands:
+                config['allowed_commands'] = [cmd.strip() for cmd in allowed_commands.split('\n') if cmd.strip()]
+            else:
+                config['allowed_commands'] = []
         
-        save_bot_config(config)
+        update_bot_config(apply_form)
         flash('Configuration updated successfully', 'success')
         return redirect(url_for('config'))
     
@@ -626,23 +1443,298 @@ def config():
 
 
 @app.route('/api/log', methods=['POST'])
+@bot_api_required
 def api_log():
-    """API endpoint for bot to log commands"""
-    data = request.json
+    """API endpoint for bot to log commands (one entry or a list of them)"""
+    data = request.get_json(silent=True)
+    entries = data if isinstance(data, list) else [data]
+    if not all(isinstance(e, dict) and e.get('command') for e in entries):
+        return jsonify({'status': 'error', 'message': 'command is required'}), 400
+    
+    for accepted, entry in enumerate(entries):
+        try:
+            log_writer.submit(entry)
+        except queue.Full:
+            # The writer can't keep up; the bot keeps the entries from `accepted` on and retries
+            return jsonify({'status': 'error', 'message': 'Log queue full', 'accepted': accepted}), 503
+    
+    return jsonify({'status': 'success'})
+
+
+@app.route('/api/activity', methods=['POST'])
+@bot_api_required
+def api_activity():
+    """API endpoint for the bot to report seen Telegram users: {user_id, username, first_name, last_name, denied}"""
+    data = request.get_json(silent=True)
+    entries = data if isinstance(data, list) else [data]
+    if not all(isinstance(e, dict) and isinstance(e.get('user_id'), int) for e in entries):
+        return jsonify({'status': 'error', 'message': 'user_id is required'}), 400
+    
+    # Held in memory and written with everyone else's activity on the next flush
+    for entry in entries:
+        activity.touch(
+            entry['user_id'], entry.get('username'), entry.get('first_name'), entry.get('last_name'),
+            denied=1 if entry.get('denied') else 0
+        )
+    
+    return jsonify({'status': 'success'})
+
+
+# Host metrics
+METRICS_RANGES = {'1h': 3600, '6h': 6 * 3600, '24h': 86400, '7d': 7 * 86400, '30d': 30 * 86400, '1y': 365 * 86400}
+_metrics_pruned_at = 0
+
+
+@app.route('/api/metrics', methods=['POST'])
+@bot_api_required
+def api_metrics():
+    """API endpoint for the bot to report host metrics: a list of {name, ts, value}"""
+    global _metrics_pruned_at
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not all(isinstance(s, dict) for s in data):
+        return jsonify({'status': 'error', 'message': 'expected a list of {name, ts, value}'}), 400
     
     db = get_db()
-    db.execute('''
-        INSERT INTO command_logs (telegram_user_id, command, output, success)
-        VALUES (?, ?, ?, ?)
-    ''', (data.get('user_id'), data.get('command'), data.get('output'), data.get('success', 0)))
+    try:
+        db.execute('BEGIN IMMEDIATE')
+        stored = timeseries.record(db, ((s.get('name'), s.get('ts'), s.get('value')) for s in data))
+        if time.time() - _metrics_pruned_at > app.config['METRICS_PRUNE_INTERVAL']:
+            _metrics_pruned_at = time.time()
+            timeseries.prune(db)
+        db.commit()
+    finally:
+        db.close()
+    return jsonify({'status': 'success', 'stored': stored})
+
+
+@app.route('/api/metrics/query')
+@login_required
+def api_metrics_query():
+    """Metric history (?series=<name>, repeatable, default all; range=1h..1y or start=&end= unix times)"""
+    started = time.perf_counter()
+    now = int(time.time())
+    if request.args.get('start'):
+        start = request.args.get('start', type=int)
+        end = request.args.get('end', now, type=int)
+    else:
+        range_name = request.args.get('range', '24h')
+        if range_name not in METRICS_RANGES:
+            return jsonify({'status': 'error', 'message': f"range must be one of {', '.join(METRICS_RANGES)}"}), 400
+        start, end = now - METRICS_RANGES[range_name], now
+    if start is None or end is None or start >= end:
+        return jsonify({'status': 'error', 'message': 'start and end must be unix times with start < end'}), 400
     
-    # Update last seen
-    db.execute('''
-        UPDATE telegram_users 
-        SET last_seen = CURRENT_TIMESTAMP 
-        WHERE user_id = ?
-    ''', (data.get('user_id'),))
+    db = get_db()
+    names = request.args.getlist('series') or timeseries.list_series(db)
+    resolution, series = timeseries.query(db, names, start, end)
+    db.close()
+    return jsonify({
+        'start': start,
+        'end': end,
+        'resolution': resolution,
+        'series': series,
+        'query_ms': round((time.perf_counter() - started) * 1000, 2),
+    })
+
+
+@app.route('/charts')
+@login_required
+def charts():
+    """Host metrics charts"""
+    range_name = request.args.get('range', '24h')
+    if range_name not in METRICS_RANGES:
+        range_name = '24h'
+    return render_template('charts.html', range_name=range_name, ranges=METRICS_RANGES)
+
+
+@app.route('/api/logs/verify')
+@admin_required
+def api_logs_verify():
+    """Check the audit hash chain of command logs (optionally ?start=<id>&end=<id>)
+    
+    Streams one JSON object per line: progress while rows are checked, then the
+    result with status 'ok' or 'tampered'.
+    """
+    start_id = request.args.get('start', type=int)
+    end_id = request.args.get('end', type=int)
+    key = get_audit_key()
+    
+    def generate():
+        db = get_db()
+        try:
+            for report in audit_log.verify(db, key, start_id, end_id):
+                yield json.dumps(report) + '\n'
+        finally:
+            db.close()
     
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+# Scheduled jobs
+SCHEDULE_FIELDS = ('id', 'telegram_user_id', 'command', 'kind', 'interval_seconds', 'at_time',
+                   'match', 'notify', 'last_run', 'last_hash')
+
+
+def validate_schedule(data):
+    """Validate and normalize a scheduled job definition, returning (job, error)"""
+    command = (data.get('command') or '').strip()
+    kind = data.get('kind', 'every')
+    notify = data.get('notify') or 'change'
+    match = data.get('match') or None
+    
+    try:
+        telegram_user_id = int(data.get('telegram_user_id'))
+    except (TypeError, ValueError):
+        return None, 'A valid Telegram user ID is required'
+    if not command:
+        return None, 'Command is required'
+    if notify not in ('change', 'always'):
+        return None, 'Invalid notify mode'
+    if match:
+        try:
+            re.compile(match)
+        except re.error as e:
+            return None, f'Invalid match pattern: {e}'
+    
+    job = {'telegram_user_id': telegram_user_id, 'command': command, 'kind': kind,
+           'interval_seconds': None, 'at_time': None, 'match': match, 'notify': notify}
+    if kind == 'every':
+        try:
+            job['interval_seconds'] = int(data.get('interval_seconds'))
+        except (TypeError, ValueError):
+            return None, 'Interval is required'
+        if job['interval_seconds'] < 30:
+            return None, 'Interval must be at least 30 seconds'
+    elif kind == 'daily':
+        try:
+            job['at_time'] = datetime.strptime(data.get('at_time') or '', '%H:%M').strftime('%H:%M')
+        except ValueError:
+            return None, 'Time must be in HH:MM format'
+    else:
+        return None, 'Invalid schedule type'
+    return job, None
+
+
+def insert_schedule(job):
+    """Store a validated job and return it with its new ID"""
+    db = get_db()
+    cursor = db.execute('''
+        INSERT INTO scheduled_jobs (telegram_user_id, command, kind, interval_seconds, at_time, match, notify)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (job['telegram_user_id'], job['command'], job['kind'], job['interval_seconds'],
+          job['at_time'], job['match'], job['notify']))
+    db.commit()
+    db.close()
+    return dict(job, id=cursor.lastrowid, last_run=None, last_hash=None)
+
+
+@app.route('/schedules')
+@login_required
+def schedules():
+    """Scheduled jobs page"""
+    db = get_db()
+    jobs = db.execute('''
+        SELECT sj.*, tu.username, tu.first_name
+        FROM scheduled_jobs sj
+        LEFT JOIN telegram_users tu ON sj.telegram_user_id = tu.user_id
+        ORDER BY sj.created_at DESC
+    ''').fetchall()
+    db.close()
+    
+    config = load_bot_config()
+    
+    return render_template('schedules.html', jobs=jobs, authorized_ids=config.get('authorized_users', []))
+
+
+@app.route('/schedules/add', methods=['POST'])
+@admin_required
+def add_schedule():
+    """Add scheduled job (admin only)"""
+    data = request.form.to_dict()
+    if data.get('kind') == 'every':
+        try:
+            data['interval_seconds'] = int(data.get('interval_value', 0)) * int(data.get('interval_unit', 60))
+        except ValueError:
+            data['interval_seconds'] = None
+    
+    job, error = validate_schedule(data)
+    if error:
+        flash(error, 'error')
+    else:
+        job = insert_schedule(job)
+        flash(f'Scheduled job #{job["id"]} added. The bot picks it up within 30 seconds.', 'success')
+    
+    return redirect(url_for('schedules'))
+
+
+@app.route('/schedules/toggle/<int:job_id>', methods=['POST'])
+@admin_required
+def toggle_schedule(job_id):
+    """Pause or resume a scheduled job (admin only)"""
+    db = get_db()
+    db.execute('UPDATE scheduled_jobs SET is_active = 1 - is_active WHERE id = ?', (job_id,))
+    db.commit()
+    db.close()
+    
+    flash(f'Scheduled job #{job_id} updated', 'success')
+    return redirect(url_for('schedules'))
+
+
+@app.route('/schedules/delete/<int:job_id>', methods=['POST'])
+@admin_required
+def delete_schedule(job_id):
+    """Delete a scheduled job (admin only)"""
+    db = get_db()
+    db.execute('DELETE FROM scheduled_jobs WHERE id = ?', (job_id,))
+    db.commit()
+    db.close()
+    
+    flash(f'Scheduled job #{job_id} deleted', 'success')
+    return redirect(url_for('schedules'))
+
+
+@app.route('/api/schedules', methods=['GET', 'POST'])
+@bot_api_required
+def api_schedules():
+    """API endpoint for the bot to load and create scheduled jobs"""
+    if request.method == 'POST':
+        job, error = validate_schedule(request.get_json(silent=True) or {})
+        if error:
+            return jsonify({'status': 'error', 'message': error}), 400
+        return jsonify(insert_schedule(job))
+    
+    db = get_db()
+    rows = db.execute(f'''
+        SELECT {', '.join(SCHEDULE_FIELDS)} FROM scheduled_jobs WHERE is_active = 1
+    ''').fetchall()
+    db.close()
+    
+    return jsonify([dict(row) for row in rows])
+
+
+@app.route('/api/schedules/<int:job_id>', methods=['DELETE'])
+@bot_api_required
+def api_delete_schedule(job_id):
+    """API endpoint for the bot to remove a scheduled job"""
+    db = get_db()
+    cursor = db.execute('DELETE FROM scheduled_jobs WHERE id = ?', (job_id,))
+    db.commit()
+    db.close()
+    
+    if not cursor.rowcount:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify({'status': 'success'})
+
+
+@app.route('/api/schedules/<int:job_id>/run', methods=['POST'])
+@bot_api_required
+def api_schedule_run(job_id):
+    """API endpoint for the bot to record a scheduled run"""
+    data = request.get_json(silent=True) or {}
+    
+    db = get_db()
+    db.execute('UPDATE scheduled_jobs SET last_run = ?, last_hash = ? WHERE id = ?',
+               (data.get('last_run'), data.get('last_hash'), job_id))
     db.commit()
     db.close()
     
@@ -653,10 +1745,7 @@ def api_log():
 @login_required
 def api_bot_status():
     """Get bot status"""
-    return jsonify({
-        'running': is_bot_running(),
-        'pid': get_bot_pid()
-    })
+    return jsonify(get_bot_status())
 
 
 @app.route('/api/bot/start', methods=['POST'])
@@ -716,11 +1805,77 @@ def api_stats():
     })
 
 
+# Analytics
+ANALYTICS_WINDOWS = {'1': 1, '7': 7, '30': 30, 'all': None}
+
+
+def analytics_since(days):
+    """First day (YYYY-MM-DD, UTC like executed_at) of a window of days, or None for all time"""
+    if not days:
+        return None
+    return (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+
+@app.route('/analytics')
+@login_required
+def analytics():
+    """Command latency percentiles per command and per user"""
+    window = request.args.get('days', '7')
+    if window not in ANALYTICS_WINDOWS:
+        window = '7'
+    since = analytics_since(ANALYTICS_WINDOWS[window])
+    
+    db = get_db()
+    by_command = latency.summarize(db, 'command', since)
+    by_user = latency.summarize(db, 'user', since)
+    names = {row['user_id']: row for row in db.execute('SELECT user_id, username, first_name FROM telegram_users')}
+    db.close()
+    
+    return render_template('analytics.html', by_command=by_command, by_user=by_user, names=names,
+                           window=window, windows=ANALYTICS_WINDOWS)
+
+
+@app.route('/api/analytics/latency')
+@login_required
+def api_analytics_latency():
+    """Latency percentiles as JSON (?group=command|user, days=1|7|30|all)"""
+    group = request.args.get('group', 'command')
+    window = request.args.get('days', '7')
+    if group not in ('command', 'user') or window not in ANALYTICS_WINDOWS:
+        return jsonify({'status': 'error', 'message': 'group must be command or user, days 1, 7, 30 or all'}), 400
+    
+    db = get_db()
+    summary = latency.summarize(db, group, analytics_since(ANALYTICS_WINDOWS[window]))
+    db.close()
+    return jsonify({'group': group, 'days': window, 'items': summary})
+
+
+def serve_production(host, port, threads):
+    """Serve the portal with waitress, a multi-threaded production WSGI server"""
+    try:
+        from waitress import serve
+    except ImportError:
+        print('waitress is not installed. Run: pip install waitress')
+        print('On Linux you can also use: gunicorn --preload -w 4 -b 0.0.0.0:5000 wsgi:app')
+        raise SystemExit(1)
+    serve(app, host=host, port=port, threads=threads)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TeleCommand Pro Web Portal')
+    parser.add_argument('--production', action='store_true', help='Serve with waitress instead of the Flask dev server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8, help='Worker threads in production mode')
+    args = parser.parse_args()
+    
     init_db()
     print('=' * 50)
     print('TeleCommand Pro Web Portal')
     print('=' * 50)
-    print('Portal running at: http://localhost:5000')
+    print(f'Portal running at: http://localhost:{args.port}')
     print('=' * 50)
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    if args.production:
+        serve_production(args.host, args.port, args.threads)
+    else:
+        app.run(debug=True, host=args.host, port=args.port)
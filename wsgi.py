@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+"""
+TeleCommand Pro WSGI entry point
+Run the portal with several worker processes, e.g.: gunicorn --preload -w 4 -b 0.0.0.0:5000 wsgi:app
+"""
+
+from web_portal import app, init_db
+
+init_db()